@@ -0,0 +1,100 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+from pyllist import dllistnode
+from models.solution import Solution, TourNodeValue
+from utils.tracing import Tracer, count, is_tracing, tracing
+import numpy as np
+
+# Iterative voting optimiser of the current worker process, and whether the calling
+# process is tracing
+_optimiser = None
+_traced = False
+
+# Whether build_candidates may start a pool of its own. The worker processes of an
+# outer pool build candidates in process instead, as every CPU is already in use.
+_nested_pool = True
+
+def disable_nested_pool() -> None:
+    global _nested_pool
+    _nested_pool = False
+
+def _initialise_worker(optimiser, traced: bool) -> None:
+    global _optimiser, _traced
+    _optimiser = optimiser
+    _traced = traced
+
+def _build_candidate(start_location, seed) -> Tuple[List[Tuple], Dict[str, int]]:
+    np.random.seed(seed)
+    # Counters of the candidate are handed back to the trace of the calling process
+    tracer = Tracer() if _traced else None
+    with tracing(tracer):
+        tour = compact_tour(_optimiser.candidate_solution(start_location))
+    return tour, tracer.counters if tracer else dict()
+
+def compact_tour(solution: Solution) -> List[Tuple]:
+    """Tour of a Solution as (location_id, arrival_time, waiting_time, pick up rider ids,
+    drop off rider ids) tuples, cheap to send between processes
+    """
+    tour = []
+    for node in solution.llist.iternodes():
+        value = node.value
+        tour.append((
+            value.location_id,
+            value.arrival_time,
+            value.waiting_time,
+            [rider.id for rider in value.pick_up],
+            [rider.id for rider in value.drop_off]
+        ))
+    return tour
+
+def rebuild_solution(agents, graph, tour: List[Tuple]) -> Solution:
+    """Solution of the given agents following a tour created by compact_tour"""
+    riders = {agent.rider.id: agent.rider for agent in agents}
+    solution = Solution(agents, graph)
+
+    for location_id, arrival_time, waiting_time, pick_up, drop_off in tour:
+        value = TourNodeValue(location_id, arrival_time, waiting_time)
+        for rider_id in pick_up:
+            value.add_rider(riders[rider_id], 'waiting')
+        for rider_id in drop_off:
+            value.add_rider(riders[rider_id], 'onboard')
+        solution.llist.append(dllistnode(value))
+
+    solution.create_rider_schedule()
+    return solution
+
+def build_candidates(optimiser, start_locations: List, workers: int) -> List[Solution]:
+    """Build one candidate Solution per start location in a pool of worker processes
+
+    Each worker holds its own copy of the optimiser, and therefore of the agents'
+    voting state. Every candidate is built with its own seed, drawn from the
+    algorithm seed, so that candidates do not depend on the number of workers or
+    on the order in which they are built.
+
+    Within the worker process of an outer pool, the candidates are built in the
+    calling process instead, with the same seeds. Candidates are built without
+    spans, and the counters of every candidate are added to the trace of the
+    calling process, if it is tracing.
+    """
+    seeds = np.random.randint(np.iinfo(np.int32).max, size=len(start_locations))
+
+    if not _nested_pool:
+        # Seeding each candidate must not change the draws of the caller
+        state = np.random.get_state()
+        solutions = []
+        for start_location, seed in zip(start_locations, seeds.tolist()):
+            np.random.seed(seed)
+            solutions.append(optimiser.candidate_solution(start_location))
+        np.random.set_state(state)
+        return solutions
+
+    chunksize = max(1, len(start_locations) // (4*workers))
+
+    with ProcessPoolExecutor(workers, initializer=_initialise_worker, initargs=(optimiser, is_tracing())) as pool:
+        candidates = list(pool.map(_build_candidate, start_locations, seeds.tolist(), chunksize=chunksize))
+
+    for _, counters in candidates:
+        for name, value in counters.items():
+            count(name, value)
+
+    return [rebuild_solution(optimiser.agents, optimiser.graph, tour) for tour, _ in candidates]
@@ -1,7 +1,10 @@
 from algorithms.voting_rules import VotingRules
+from algorithms.solution_ranking import solution_utilities
+from algorithms.rider_orderings import get_rider_ordering
 from utils.info_utils import strategy_info
+from utils.tracing import count, span
 from pyllist.dllist import dllistnode
-from models.solution import Solution, TourNodeValue
+from models.solution import Fleet, Solution, SolutionPool, TourNodeValue
 from typing import List
 import numpy as np
 from models.graph import Graph
@@ -21,6 +24,9 @@ class GreedyInsert:
     params: Dict
         Additional options for the algorithm in the form of key-value pairs
         - 'iterations': <an integer>
+        - 'orderings': <a list of rider orderings, applied to the first iterations>
+        - 'max_candidates': <number of best solutions retained for the final vote>
+        - 'vehicles': <number of vehicles in the fleet, 1 by default>
         - <Potential parameters, to be added>
 
     Methods
@@ -33,47 +39,84 @@ class GreedyInsert:
         self.params = params
         self.graph = graph
         self.voting_rule = self.__get_voting_rule(params['final_voting_rule'])
+        self.orderings = [get_rider_ordering(ordering) for ordering in params.get('orderings', [])]
+        self.vehicles = min(params.get('vehicles', 1), len(agents))
 
     def optimise(self) -> Solution:
 
-        solutions = []
-        for _ in range(self.params['iterations']):
-            np.random.shuffle(self.agents)
-            start_agent = self.agents[0]
+        # Without a voting rule, only the incumbent is needed
+        if self.voting_rule:
+            solutions = SolutionPool(self.params.get('objective'), self.params.get('max_candidates'))
+        else:
+            solutions = SolutionPool(self.params['objective'], capacity=1)
+
+        for iteration in range(self.params['iterations']):
+            self.__order_agents(iteration)
+            start_agents = self.agents[:self.vehicles]
 
-            # Create new Solution
-            solution = self.__initialise_new_solution(start_agent)
+            # Create new Solution, with one start rider per vehicle
+            solution = self.__initialise_new_solution(start_agents)
             # Assign n other riders
-            other_agents = self.agents[1:]
+            other_agents = self.agents[self.vehicles:]
             for agent in other_agents:
                 self.__best_allocation(agent, solution)
 
             solution.create_rider_schedule()
             solution.calculate_objectives()
-            solutions.append(solution)
+            solutions.add(solution)
 
         if not self.voting_rule:
-            if self.params['objective'] == "gini_index":
-                return min(solutions, key=lambda sol: sol.objectives['gini_index'])
-            else:
-                return max(solutions, key=lambda sol: sol.objectives[self.params['objective']])
+            return solutions.best()
 
         else:
-            ranking_functions = [agent.rank_solutions for agent in self.agents]
-            weights = [agent.weight for agent in self.agents]
-            voted_solution = self.voting_rule(solutions, ranking_functions, weights)
-            return voted_solution
+            with span('final_vote'):
+                candidate_solutions = solutions.solutions()
+                utilities = solution_utilities(self.agents, candidate_solutions)
+                weights = [agent.weight for agent in self.agents]
+                voted_solution = self.voting_rule(candidate_solutions, utilities, weights)
+                return voted_solution
     
+    def __order_agents(self, iteration: int):
+
+        # Strong deterministic orderings are tried first, the remaining
+        # iterations fall back to random restarts
+        if iteration < len(self.orderings):
+            self.agents = self.orderings[iteration](self.agents, self.graph)
+        else:
+            np.random.shuffle(self.agents)
+
     def __get_voting_rule(self, voting_rule: str):
         if voting_rule == 'popularity':
             return VotingRules.popularity
         
         elif voting_rule == 'borda_count':
             return VotingRules.borda_count
+
+        elif voting_rule == 'harmonic':
+            return VotingRules.harmonic
+
+        elif voting_rule == 'instant_runoff':
+            return VotingRules.instant_runoff
+
+        elif voting_rule == 'copeland':
+            return VotingRules.copeland
+
+        elif voting_rule == 'maximin':
+            return VotingRules.maximin
+
+        elif voting_rule == 'schulze':
+            return VotingRules.schulze
         
         return None
         
-    def __initialise_new_solution(self, start_agent):
+    def __initialise_new_solution(self, start_agents: List[GreedyInsertAgent]) -> Solution:
+        tours = [self.__initialise_new_tour(start_agent) for start_agent in start_agents]
+
+        if len(tours) == 1:
+            return tours[0]
+        return Fleet(self.agents, self.graph, tours)
+
+    def __initialise_new_tour(self, start_agent):
         solution = Solution(self.agents, self.graph)
 
         # Create TourNodeValue for departure
@@ -93,46 +136,82 @@ class GreedyInsert:
 
         start_agent.departure_node = depart_node
         start_agent.arrival_node = arrival_node
+        start_agent.tour = solution
 
         return solution
 
     def __best_allocation(self, agent: GreedyInsertAgent, solution: Solution):
 
+        # Every vehicle is evaluated independently, and the best departure
+        # strategy across the fleet is applied
         departure_strategies = []
-        for node in solution.iterator():
-            departure_strategy = self.__create_strategy(agent, node, 'waiting', insert_position='before')
-            if departure_strategy:
-                departure_strategies.append(departure_strategy)
-                
-            # Special case at tail of linked list: Attempt to create an 
-            # additional departure strategy by inserting after the current node
-            if node.next == None:
-                departure_strategy = self.__create_strategy(agent, node, 'waiting', insert_position='after')
-                if departure_strategy:
-                    departure_strategies.append(departure_strategy)
+        for tour in solution.vehicle_tours():
+            for departure_strategy in self.__departure_strategies(agent, tour):
+                departure_strategies.append((tour, departure_strategy))
         
-        best_departure_strategy = \
-            max(departure_strategies, key=lambda strat: agent.rider.utility(strat.strat['allocated_node'].value.departure_time, 0))
-        departure_node = best_departure_strategy.apply(solution)
+        count('insert_candidates', len(departure_strategies))
+        tour, best_departure_strategy = \
+            max(departure_strategies, key=lambda pair: agent.rider.utility(pair[1].strat['allocated_node'].value.departure_time, 0))
+        departure_node = best_departure_strategy.apply(tour)
         agent.departure_node = departure_node
+        agent.tour = tour
+
+        # Riders are dropped off by the vehicle that picked them up
+        nodes, to_stop, from_stop = self.__stop_travel_times(tour, agent.rider.destination_id)
+        start_position = nodes.index(departure_node)
 
         arrival_strategies = []
-        for node in solution.iterator(start_node=departure_node):
-            arrival_strategy = self.__create_strategy(agent, node, 'onboard', insert_position='after')
+        for position in range(start_position, len(nodes)):
+            node = nodes[position]
+            arrival_strategy = self.__create_strategy(agent, node, 'onboard', (to_stop[position+1], from_stop[position+2]), insert_position='after')
             if arrival_strategy:
                 arrival_strategies.append(arrival_strategy)
         
+        count('insert_candidates', len(arrival_strategies))
         best_arrival_strategy = \
             max(arrival_strategies, key=lambda strat: agent.rider.utility(departure_node.value.departure_time, strat.strat['allocated_node'].value.arrival_time))
-        arrival_node = best_arrival_strategy.apply(solution)
+        arrival_node = best_arrival_strategy.apply(tour)
         agent.arrival_node = arrival_node
 
-    def __create_strategy(self, agent, ref_node, status, insert_position=None):
+    def __departure_strategies(self, agent: GreedyInsertAgent, tour: Solution) -> List["Strategy"]:
+
+        # Travel times from the rider's start location to every tour node are fetched once per scan
+        nodes, to_stop, from_stop = self.__stop_travel_times(tour, agent.rider.start_id)
+
+        departure_strategies = []
+        for position, node in enumerate(nodes):
+            departure_strategy = self.__create_strategy(agent, node, 'waiting', (to_stop[position], from_stop[position+1]), insert_position='before')
+            if departure_strategy:
+                departure_strategies.append(departure_strategy)
+                
+            # Special case at tail of linked list: Attempt to create an 
+            # additional departure strategy by inserting after the current node
+            if node.next == None:
+                departure_strategy = self.__create_strategy(agent, node, 'waiting', (to_stop[position+1], from_stop[position+2]), insert_position='after')
+                if departure_strategy:
+                    departure_strategies.append(departure_strategy)
+
+        return departure_strategies
+
+    def __stop_travel_times(self, solution: Solution, location_id):
+        """Travel times from every tour node to location_id, and from location_id to
+        every tour node, padded with None on both ends. The node at tour position i
+        is at index i+1.
+        """
+        nodes, location_indices = solution.tour()
+        location_index, time_array = self.graph.time_array()
+        stop_index = location_index[location_id]
+        count('travel_time_lookups', 2*len(location_indices))
+        to_stop = time_array[location_indices, stop_index].tolist()
+        from_stop = time_array[stop_index, location_indices].tolist()
+        return nodes, [None] + to_stop + [None], [None] + from_stop + [None]
+
+    def __create_strategy(self, agent, ref_node, status, travel_times, insert_position=None):
         rider = agent.rider
         location_id = rider.start_id if status == 'waiting' else rider.destination_id
 
-        if self.__check_valid_insert(ref_node, location_id, position=insert_position):
-            strategy = self.__insert_at_node(agent, ref_node, status, position=insert_position)
+        if self.__check_valid_insert(ref_node, location_id, travel_times, position=insert_position):
+            strategy = self.__insert_at_node(agent, ref_node, status, travel_times, position=insert_position)
 
         elif ref_node.value.location_id == location_id:
             strategy = self.__stay_at_node(agent, ref_node, status)
@@ -150,8 +229,8 @@ class GreedyInsert:
         }
         return Strategy(strategy_details)
 
-    def __insert_at_node(self, agent, ref_node, current_status, position='before'):
-        new_node_value = self.__create_new_value_by_insertion(agent.rider, ref_node, position, current_status)
+    def __insert_at_node(self, agent, ref_node, current_status, travel_times, position='before'):
+        new_node_value = self.__create_new_value_by_insertion(agent.rider, ref_node, position, current_status, travel_times)
         strategy_details = {
             'action': f'insert_{position}',
             'agent': agent,
@@ -161,7 +240,10 @@ class GreedyInsert:
         }
         return Strategy(strategy_details)
 
-    def __check_valid_insert(self, ref_node, location_id, position='before'):
+    def __check_valid_insert(self, ref_node, location_id, travel_times, position='before'):
+
+        # Travel times from the left node to location_id, and from location_id to the right node
+        left_to_new_travel_time, new_to_right_travel_time = travel_times
         
         # Verify adjacent nodes, before attempting to insert between them
         if position == 'before':
@@ -180,7 +262,7 @@ class GreedyInsert:
         # Accept the insertion if inserting before the head node does not cause
         # the new arrival time of the head node to exceed its departure time
         elif not left_node:
-            right_node_new_arrival_time = self.graph.travel_time(location_id, right_node.value.location_id)
+            right_node_new_arrival_time = new_to_right_travel_time
             if right_node_new_arrival_time > right_node.value.departure_time:
                 return False
 
@@ -193,9 +275,6 @@ class GreedyInsert:
         # Accept insertion if inserting between these two nodes do not cause the new 
         # arrival time of the right_node to exceed its departure time
         else:
-            left_to_new_travel_time = self.graph.travel_time(left_node.value.location_id, location_id)
-            new_to_right_travel_time = self.graph.travel_time(location_id, right_node.value.location_id)
-
             new_node_arrival_time = left_node.value.departure_time + left_to_new_travel_time
             right_node_new_arrival_time = new_node_arrival_time + new_to_right_travel_time
             if right_node_new_arrival_time > right_node.value.departure_time:
@@ -203,9 +282,10 @@ class GreedyInsert:
         
         return True
         
-    def __create_new_value_by_insertion(self, rider, ref_node, insert_position, status):
+    def __create_new_value_by_insertion(self, rider, ref_node, insert_position, status, travel_times):
         new_node_location_id = rider.start_id if status == 'waiting' else rider.destination_id
         preferred_time = rider.optimal_departure if status == 'waiting' else rider.optimal_arrival
+        prev_to_new_travel_time, new_to_next_travel_time = travel_times
 
         # Verify adjacent nodes, before calculating time features for the new TourNodeValue
         if insert_position == 'before':
@@ -217,7 +297,7 @@ class GreedyInsert:
         
         # Inserting before the start node. Here, right_node is the start node
         if not left_node:
-            right_node_new_arrival_time = self.graph.travel_time(new_node_location_id, right_node.value.location_id)
+            right_node_new_arrival_time = new_to_next_travel_time
 
             # Waiting time for new TourNodeValue is dependent on the remainding waiting time
             # for right_node after performing the insert before right_node.
@@ -231,13 +311,10 @@ class GreedyInsert:
         elif not right_node:
 
             # Waiting time is 
-            new_node_arrival_time = left_node.value.departure_time + self.graph.travel_time(left_node.value.location_id, new_node_location_id)
+            new_node_arrival_time = left_node.value.departure_time + prev_to_new_travel_time
             new_node_wait_time = max(preferred_time - new_node_arrival_time, 0)
         
         else:
-            prev_to_new_travel_time = self.graph.travel_time(left_node.value.location_id, new_node_location_id)
-            new_to_next_travel_time = self.graph.travel_time(new_node_location_id, right_node.value.location_id)
-
             new_node_arrival_time = left_node.value.departure_time + prev_to_new_travel_time
             next_node_arrival_time = new_node_arrival_time + new_to_next_travel_time
 
@@ -2,8 +2,13 @@ from typing import Callable, Set, List
 from models.agent import IterativeVotingAgent
 from models.solution import Solution, TourNodeValue
 from algorithms.voting_rules import VotingRules
+from algorithms.candidate_pool import build_candidates
+from algorithms.location_ranking import LocationUtilities
+from algorithms.solution_ranking import solution_utilities
+from algorithms.start_locations import cluster_representatives, demand_medoids, rider_demand, sampled_locations
 from pyllist import dllistnode
 from models.graph import Graph
+from utils.tracing import count, span
 
 class IterativeVoting1:
     """Voting algorithm to find sub-optimal Solution
@@ -28,26 +33,108 @@ class IterativeVoting1:
         self.graph = graph
         self.iterative_voting_rule = self.__voting_rule(params.get("iterative_voting_rule"))
         self.final_voting_rule = self.__voting_rule(params.get("final_voting_rule"))
-
+        self.workers = params.get('workers', 1)
+        self.location_utilities = LocationUtilities(agents, graph)
+        self.start_locations = params.get('start_locations', 'all')
+        self.num_start_locations = params.get('num_start_locations', 10)
+        self.pruning = params.get('pruning', False)
+
+        if self.start_locations == 'clusters' and not graph.cluster_info:
+            raise ValueError("start_locations 'clusters' requires a graph with clusters")
     
     def optimise(self):
 
-        candidate_solutions = []
-        location_ids = set([source for source, _ in self.graph.time_matrix])
+        with span('start_locations'):
+            location_ids = self.__select_start_locations()
+
+        with span('candidates'):
+            if self.workers > 1:
+                candidate_solutions = build_candidates(self, location_ids, self.workers)
+            else:
+                candidate_solutions = []
+                best_utilitarian = None
+
+                for location_id in location_ids:
+                    solution = self.candidate_solution(location_id, best_utilitarian)
+
+                    # Abandoned candidates cannot beat the best candidate so far
+                    if solution is None:
+                        count('pruned_candidates')
+                        continue
+
+                    candidate_solutions.append(solution)
+                    if self.pruning:
+                        utilitarian = sum(solution.get_rider_utilities().values())
+                        if best_utilitarian is None or utilitarian > best_utilitarian:
+                            best_utilitarian = utilitarian
+
+        # Utility of every candidate solution for each Passenger
+        with span('final_vote'):
+            utilities = solution_utilities(self.agents, candidate_solutions)
+            weights = [agent.weight for agent in self.agents]
+            return self.final_voting_rule(candidate_solutions, utilities, weights)
+
+    def candidate_solution(self, start_location: int, utility_threshold: float = None) -> Solution:
+        """Solution found by the iterative voting procedure, starting at start_location.
+        If a utility_threshold is supplied, the procedure is abandoned and None is returned
+        as soon as the total utility of the riders can no longer reach it.
+        """
+        return self.__initiate_voting(start_location, utility_threshold)
+
+    def __select_start_locations(self) -> List[int]:
+        location_ids = sorted(set([source for source, _ in self.graph.time_matrix]), key=str)
+
+        if self.start_locations == 'sampled':
+            return sampled_locations(location_ids, self.num_start_locations)
+
+        elif self.start_locations == 'medoids':
+            return demand_medoids(self.graph, rider_demand(self.agents), self.num_start_locations)
+
+        elif self.start_locations == 'clusters':
+            return cluster_representatives(self.graph, rider_demand(self.agents))
+
+        return location_ids
+
+    def __utility_bound(self, waiting, onboard, served_utility: float, current_node) -> float:
+        """Upper bound of the total utility of the riders, given the partial solution
+        ending at current_node. Riders that are not yet picked up (or dropped off)
+        cannot depart (or arrive) earlier than the current departure time.
+        """
+        departure_time = int(current_node.value.departure_time)
+        bound = served_utility
+
+        for agent in onboard:
+            rider = agent.rider
+            if agent.departure_node is current_node:
+                departure_deviation = max(0, departure_time - rider.optimal_departure)
+            else:
+                departure_deviation = abs(rider.optimal_departure - int(agent.departure_node.value.departure_time))
+            arrival_deviation = max(0, departure_time - rider.optimal_arrival)
+            bound += (rider.beta**departure_deviation + rider.beta**arrival_deviation) / 2
 
-        for location_id in location_ids:
-            candidate_solutions.append(self.__initiate_voting(location_id))
+        for agent in waiting:
+            rider = agent.rider
+            departure_deviation = max(0, departure_time - rider.optimal_departure)
+            arrival_deviation = max(0, departure_time - rider.optimal_arrival)
+            bound += (rider.beta**departure_deviation + rider.beta**arrival_deviation) / 2
 
-        # List of solution ranking function from each Passenger
-        solution_ranking_functions = [agent.rank_solutions for agent in self.agents]
-        weights = [agent.weight for agent in self.agents]
-        return self.final_voting_rule(candidate_solutions, solution_ranking_functions, weights)
+        return bound
 
     def __voting_rule(self, rule: str) -> Callable:
         if rule == "borda_count":
             return VotingRules.borda_count
         elif rule == 'popularity':
             return VotingRules.popularity
+        elif rule == "harmonic":
+            return VotingRules.harmonic
+        elif rule == "instant_runoff":
+            return VotingRules.instant_runoff
+        elif rule == "copeland":
+            return VotingRules.copeland
+        elif rule == "maximin":
+            return VotingRules.maximin
+        elif rule == "schulze":
+            return VotingRules.schulze
     
     def __stations_to_visit(self, waiting, onboard) -> List[int]:
         stations = []
@@ -59,7 +146,7 @@ class IterativeVoting1:
         
         return stations
 
-    def __initiate_voting(self, start_location: int):
+    def __initiate_voting(self, start_location: int, utility_threshold: float = None):
         
         # Initialise Solution object
         for agent in self.agents:
@@ -72,6 +159,7 @@ class IterativeVoting1:
         waiting: List[IterativeVotingAgent] = []
         serving: List[IterativeVotingAgent] = []
         onboard: List[IterativeVotingAgent] = []
+        served_utility = 0
 
         for agent in self.agents:
             agent.current_node = new_solution.tail()
@@ -81,12 +169,13 @@ class IterativeVoting1:
         # Repeat voting process until all Passengers are served
         while len(serving) > 0:
             current_node = new_solution.tail()
+            count('voting_rounds')
             candidate_locations = self.__stations_to_visit(waiting, onboard)
 
-            # Supply candidate locations AND riders' location ranking function to the voting rule
-            location_ranking_functions = [agent.rank_locations for agent in serving]
+            # Supply candidate locations AND riders' location utilities to the voting rule
+            location_utilities = self.location_utilities.utilities(serving, candidate_locations)
             weights = [agent.weight for agent in serving]
-            voted_location = self.iterative_voting_rule(candidate_locations, location_ranking_functions, weights)
+            voted_location = self.iterative_voting_rule(candidate_locations, location_utilities, weights)
             
             # Grow the Solution if the voted location is different
             # than the current location
@@ -121,11 +210,18 @@ class IterativeVoting1:
                     served_agents.append(agent)
                     current_node.value.add_rider(agent.rider, 'onboard')
                     agent.status = 'served'
+                    served_utility += agent.rider.utility(
+                        int(agent.departure_node.value.departure_time), int(current_node.value.arrival_time)
+                    )
 
             waiting = [agent for agent in waiting if agent not in boarded_agents]
             onboard = [agent for agent in onboard if agent not in served_agents]
             onboard.extend(boarded_agents)
             serving = [agent for agent in serving if agent not in served_agents]
+
+            if utility_threshold is not None and \
+                self.__utility_bound(waiting, onboard, served_utility, current_node) < utility_threshold:
+                return None
         
         new_solution.create_rider_schedule()
         return new_solution
\ No newline at end of file
@@ -2,9 +2,14 @@ from typing import Callable, List
 from models.agent import IterativeVotingAgent
 from models.solution import Solution, TourNodeValue
 from algorithms.voting_rules import VotingRules
+from algorithms.candidate_pool import build_candidates
+from algorithms.location_ranking import LocationUtilities
+from algorithms.solution_ranking import solution_utilities
+from algorithms.voter_index import VoterIndex
 from pyllist import dllistnode
 from models.graph import Graph
 from collections import OrderedDict
+from utils.tracing import count, span
 
 class IterativeVoting2:
     """Voting algorithm to find sub-optimal Solution
@@ -31,25 +36,33 @@ class IterativeVoting2:
         self.iterative_voting_rule = self.__voting_rule(params.get("iterative_voting_rule"))
         self.final_voting_rule = self.__voting_rule(params.get("final_voting_rule"))
         self.wait_time = params.get('wait_time')
+        self.workers = params.get('workers', 1)
+        self.location_utilities = LocationUtilities(agents, graph)
     
     def optimise(self):
 
-        candidate_solutions = []
-
         start_locations = OrderedDict()
         for agent in self.agents:
             start_locations[agent.rider.start_id] = None
-        
-        for start_location in list(start_locations.keys()):
-            for agent in self.agents:
-                agent.reset_status()              
-            solution = self.__initiate_voting(start_location)
-            candidate_solutions.append(solution)
+        start_locations = list(start_locations.keys())
+
+        with span('candidates'):
+            if self.workers > 1:
+                candidate_solutions = build_candidates(self, start_locations, self.workers)
+            else:
+                candidate_solutions = [self.candidate_solution(start_location) for start_location in start_locations]
 
-        # List of solution ranking function from each Passenger
-        solution_ranking_functions = [agent.rank_solutions for agent in self.agents]
-        weights = [agent.weight for agent in self.agents]
-        return self.final_voting_rule(candidate_solutions, solution_ranking_functions, weights)
+        # Utility of every candidate solution for each Passenger
+        with span('final_vote'):
+            utilities = solution_utilities(self.agents, candidate_solutions)
+            weights = [agent.weight for agent in self.agents]
+            return self.final_voting_rule(candidate_solutions, utilities, weights)
+
+    def candidate_solution(self, start_location: int) -> Solution:
+        """Solution found by the iterative voting procedure, starting at start_location"""
+        for agent in self.agents:
+            agent.reset_status()
+        return self.__initiate_voting(start_location)
 
     def __voting_rule(self, rule: str) -> Callable:
         if rule == "borda_count":
@@ -60,6 +73,12 @@ class IterativeVoting2:
             return VotingRules.harmonic
         elif rule == "instant_runoff":
             return VotingRules.instant_runoff
+        elif rule == "copeland":
+            return VotingRules.copeland
+        elif rule == "maximin":
+            return VotingRules.maximin
+        elif rule == "schulze":
+            return VotingRules.schulze
     
     def __stations_to_visit(self, selected_voters) -> List[int]:
         stations = []
@@ -71,27 +90,6 @@ class IterativeVoting2:
                 stations.append(voter.rider.destination_id)
         return stations
 
-    def __select_voters(self, current_node, serving: List[IterativeVotingAgent]):
-        selected_voters = []
-
-        for agent in serving:
-            rider = agent.rider
-            if agent.status == "waiting":
-                location_id = rider.start_id
-                travel_time = self.graph.travel_time(current_node.value.location_id, location_id)
-                expected_arrival_time = current_node.value.departure_time + travel_time
-
-                if (expected_arrival_time >= rider.optimal_departure - rider.beta*self.wait_time and \
-                    expected_arrival_time < rider.optimal_departure + rider.beta*self.wait_time) or \
-                        current_node.value.departure_time >= rider.optimal_departure:
-                    selected_voters.append(agent)
-                
-            elif agent.status == "onboard":
-                if current_node.value.departure_time >= rider.optimal_arrival:
-                    selected_voters.append(agent)
-
-        return selected_voters
-
     def __initiate_voting(self, start_location: int):
 
         # Initialise Solution object
@@ -99,26 +97,28 @@ class IterativeVoting2:
         first_tour_node_value = TourNodeValue(start_location, 0, 0)
         new_solution.append(dllistnode(first_tour_node_value))
         
-        serving: List[IterativeVotingAgent] = []
         for agent in self.agents:
             agent.current_node = new_solution.tail()
-            serving.append(agent)
+        serving = VoterIndex(self.agents, self.graph, self.wait_time)
             
         # Repeat voting process until all Passengers are served
         while len(serving) > 0:
 
             current_node = new_solution.tail()
-            voters = self.__select_voters(current_node, serving)
+            voters = serving.select_voters(current_node.value.location_id, current_node.value.departure_time)
             
-            # If there are no interested voters, increase current time and move to next iteration
+            # If there are no interested voters, advance the current time to the
+            # next moment a voter becomes eligible and move to next iteration
             if len(voters) == 0:
-                current_node.value.update_waiting_time(current_node.value.waiting_time + self.wait_time)
+                idle_ticks = serving.idle_ticks(current_node.value.location_id, current_node.value.departure_time)
+                current_node.value.update_waiting_time(current_node.value.waiting_time + idle_ticks*self.wait_time)
                 continue
             
+            count('voting_rounds')
             candidate_locations = self.__stations_to_visit(voters)
-            location_ranking_functions = [agent.rank_locations for agent in voters]
+            location_utilities = self.location_utilities.utilities(voters, candidate_locations)
             weights = [agent.weight for agent in voters]
-            voted_location = self.iterative_voting_rule(candidate_locations, location_ranking_functions, weights)
+            voted_location = self.iterative_voting_rule(candidate_locations, location_utilities, weights)
             
             # Grow the Solution if the voted location is different
             # than the current location
@@ -134,22 +134,19 @@ class IterativeVoting2:
             else:
                 current_node.value.update_waiting_time(current_node.value.waiting_time + self.wait_time)
             
-            served_agents = []
             for agent in voters:
                 agent.current_node = current_node
                 if agent.status == "waiting" and agent.rider.start_id == current_node.value.location_id:
                     agent.departure_node = current_node
                     current_node.value.add_rider(agent.rider, 'waiting')
                     agent.status = "onboard"
+                    serving.board(agent)
                 
                 elif agent.status == "onboard" and agent.rider.destination_id == current_node.value.location_id:
                     agent.arrival_node = current_node
                     current_node.value.add_rider(agent.rider, 'onboard')
                     agent.status = "served"
-                    served_agents.append(agent)
-
-            for agent in served_agents:
-                serving.remove(agent)
+                    serving.serve(agent)
         
         new_solution.create_rider_schedule()
         return new_solution
@@ -0,0 +1,92 @@
+from typing import List
+from models.agent import IterativeVotingAgent
+from models.graph import Graph
+from utils.tracing import count
+import numpy as np
+
+class LocationUtilities:
+    """Utility of candidate locations for the voters of an iterative voting round
+
+    The utility of a candidate location for a voter is the rider's utility if the
+    vehicle went to that location next: a waiting rider is then picked up at their
+    start location, while an onboard rider keeps their departure time, and both
+    then travel straight to their destination. Utilities are computed with array
+    gathers from the travel time array of the graph. The riders' locations,
+    preferences and trip times do not change during the voting procedure, and
+    are gathered once for all agents. The legs that depend on the current node
+    of a voter and on the candidate are gathered once per round for every
+    distinct candidate, so no utilities are kept between rounds, and nothing
+    needs to be invalidated when the tour advances.
+
+    Attributes
+    ----------
+    graph: Graph
+        Graph used to compute travel times
+
+    Methods
+    ----------
+    utilities(voters, candidate_locations)
+        Voters x candidates utility array
+    """
+
+    def __init__(self, agents: List[IterativeVotingAgent], graph: Graph) -> None:
+        self.graph = graph
+        self.__location_index, self.__time_array = graph.time_array()
+        self.__positions = {agent.rider.id: position for position, agent in enumerate(agents)}
+
+        riders = [agent.rider for agent in agents]
+        self.__starts = np.array([self.__location_index[rider.start_id] for rider in riders], dtype=int)
+        self.__destinations = np.array([self.__location_index[rider.destination_id] for rider in riders], dtype=int)
+        self.__betas = np.array([rider.beta for rider in riders], dtype=float)
+        self.__optimal_departures = np.array([rider.optimal_departure for rider in riders], dtype=float)
+        self.__optimal_arrivals = np.array([rider.optimal_arrival for rider in riders], dtype=float)
+        self.__trip_times = self.__time_array[self.__starts, self.__destinations]
+        count('travel_time_lookups', len(self.__trip_times))
+
+    def utilities(self, voters: List[IterativeVotingAgent], candidate_locations: List[int]) -> np.ndarray:
+        time_array = self.__time_array
+        rows = np.array([self.__positions[voter.rider.id] for voter in voters], dtype=int)
+
+        # Requested stops are often shared by several voters, so every
+        # distinct candidate location is only evaluated once
+        candidate_ids = list(dict.fromkeys(candidate_locations))
+        candidates = np.array([self.__location_index[location_id] for location_id in candidate_ids], dtype=int)
+        columns = {location_id: column for column, location_id in enumerate(candidate_ids)}
+
+        current_locations = np.empty(len(voters), dtype=int)
+        current_departures = np.empty(len(voters))
+        onboard_departures = np.full(len(voters), np.nan)
+        waiting = np.empty(len(voters), dtype=bool)
+
+        for index, voter in enumerate(voters):
+            current_value = voter.current_node.value
+            current_locations[index] = self.__location_index[current_value.location_id]
+            current_departures[index] = current_value.departure_time
+            waiting[index] = voter.status == 'waiting'
+            if voter.status == 'onboard':
+                onboard_departures[index] = voter.departure_node.value.departure_time
+
+        starts = self.__starts[rows]
+        betas = self.__betas[rows][:, None]
+        trip_times = self.__trip_times[rows][:, None]
+
+        count('travel_time_lookups', 2*len(voters)*len(candidates))
+        candidate_arrival_times = current_departures[:, None] + time_array[current_locations[:, None], candidates[None, :]]
+
+        # Waiting riders are picked up after visiting the candidate location, while
+        # onboard riders keep their departure time
+        departure_times = np.where(
+            waiting[:, None],
+            candidate_arrival_times + time_array[candidates[None, :], starts[:, None]],
+            onboard_departures[:, None]
+        )
+        arrival_times = np.where(
+            waiting[:, None],
+            departure_times + trip_times,
+            candidate_arrival_times + trip_times
+        )
+
+        utilities = (betas**np.abs(self.__optimal_departures[rows][:, None] - departure_times) + \
+            betas**np.abs(self.__optimal_arrivals[rows][:, None] - arrival_times)) / 2
+
+        return utilities[:, [columns[location_id] for location_id in candidate_locations]]
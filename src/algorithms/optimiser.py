@@ -68,7 +68,16 @@ class Optimiser:
                 new_time_matrix[(source, target)] = graph.time_matrix[(source, target)]
                 new_distance_matrix[(source, target)] = graph.distance_matrix[(source, target)]
         
-        return Graph(graph.igraph, new_location_ids, None, new_time_matrix, new_distance_matrix)
+        # Restrict clusters to passenger locations
+        new_cluster_info = None
+        if graph.cluster_info is not None:
+            new_cluster_info = dict()
+            for centroid_id, location_ids in graph.cluster_info.items():
+                cluster_locations = [location_id for location_id in location_ids if location_id in passenger_locations]
+                if cluster_locations:
+                    new_cluster_info[centroid_id] = cluster_locations
+
+        return Graph(graph.igraph, new_location_ids, new_cluster_info, new_time_matrix, new_distance_matrix)
 
     def __customise_algorithm(self, options: Dict[str, object]) -> Callable:
 
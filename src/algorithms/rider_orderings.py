@@ -0,0 +1,71 @@
+from typing import Callable, List
+import numpy as np
+from models.graph import Graph
+
+class RiderOrderings:
+    """Insertion orderings for the greedy insert optimisers
+
+    Each ordering receives the list of agents and the graph used by the
+    optimiser, and returns a new list of agents. The first agent of the
+    returned list seeds the tour, and the remaining agents are inserted
+    in the returned order.
+    """
+
+    def optimal_departure(agents: List["Agent"], graph: Graph) -> List["Agent"]:
+        """Earliest preferred departure first"""
+        return sorted(agents, key=lambda agent: agent.rider.optimal_departure)
+
+    def beta(agents: List["Agent"], graph: Graph) -> List["Agent"]:
+        """Least flexible (lowest beta) riders first"""
+        return sorted(agents, key=lambda agent: agent.rider.beta)
+
+    def trip_length(agents: List["Agent"], graph: Graph) -> List["Agent"]:
+        """Longest trips first"""
+        return sorted(
+            agents,
+            key=lambda agent: graph.travel_time(agent.rider.start_id, agent.rider.destination_id),
+            reverse=True
+        )
+
+    def regret(agents: List["Agent"], graph: Graph) -> List["Agent"]:
+        """Riders that lose the most utility when sharing a vehicle first
+
+        For every rider, the smallest deviation from their optimal departure
+        that results from being picked up right after another rider's pick up
+        is used as the deviation they are expected to suffer. The regret of
+        a rider is the utility lost by this deviation.
+        """
+        riders = [agent.rider for agent in agents]
+        departures = np.array([rider.optimal_departure for rider in riders])
+        betas = np.array([rider.beta for rider in riders])
+        transfer_times = np.array([
+            [graph.travel_time(other.start_id, rider.start_id) for other in riders]
+            for rider in riders
+        ])
+
+        # deviations[i, j]: deviation of rider i when picked up after rider j
+        deviations = np.abs(departures[None, :] + transfer_times - departures[:, None])
+        np.fill_diagonal(deviations, np.inf)
+        min_deviations = deviations.min(axis=1) if len(riders) > 1 else np.zeros(len(riders))
+        regrets = 1 - betas**min_deviations
+
+        order = np.argsort(-regrets, kind="stable")
+        return [agents[index] for index in order]
+
+    def random(agents: List["Agent"], graph: Graph) -> List["Agent"]:
+        """Random ordering, seeded by the optimiser's algorithm seed"""
+        shuffled_agents = list(agents)
+        np.random.shuffle(shuffled_agents)
+        return shuffled_agents
+
+def get_rider_ordering(ordering: str) -> Callable:
+    if ordering == "optimal_departure":
+        return RiderOrderings.optimal_departure
+    elif ordering == "beta":
+        return RiderOrderings.beta
+    elif ordering == "trip_length":
+        return RiderOrderings.trip_length
+    elif ordering == "regret":
+        return RiderOrderings.regret
+    elif ordering == "random":
+        return RiderOrderings.random
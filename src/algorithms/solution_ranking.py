@@ -0,0 +1,18 @@
+from typing import List
+from models.agent import Agent
+from models.solution import Solution
+import numpy as np
+
+def solution_utilities(agents: List[Agent], solutions: List[Solution]) -> np.ndarray:
+    """Utility of every candidate Solution for every agent, as an agents x solutions array.
+
+    Built once from the rider utilities of each Solution (see Solution.get_rider_utilities),
+    which are only computed the first time they are requested.
+    """
+    utilities = np.empty((len(agents), len(solutions)))
+
+    for column, solution in enumerate(solutions):
+        rider_utilities = solution.get_rider_utilities()
+        utilities[:, column] = [rider_utilities[agent.rider] for agent in agents]
+
+    return utilities
@@ -0,0 +1,70 @@
+"""Subsets of start locations used to seed the candidate solutions of IterativeVoting1"""
+
+from collections import Counter
+from typing import Dict, List
+from models.graph import Graph
+from utils.tracing import count
+import numpy as np
+
+def rider_demand(agents) -> Dict[int, int]:
+    """Number of riders starting at each location, in order of first appearance"""
+    return dict(Counter(agent.rider.start_id for agent in agents))
+
+def sampled_locations(location_ids: List[int], num_locations: int) -> List[int]:
+    """Uniformly sampled start locations, seeded by the algorithm seed"""
+    num_locations = min(num_locations, len(location_ids))
+    sample = np.random.choice(len(location_ids), size=num_locations, replace=False)
+    return [location_ids[index] for index in sorted(sample)]
+
+def demand_medoids(graph: Graph, demand: Dict[int, int], num_medoids: int, max_iterations: int = 100) -> List[int]:
+    """k-medoids of the riders' start locations, weighted by demand, using travel times
+    as the distance between locations. Medoids are initialised greedily, then
+    refined by alternating assignment and medoid updates until they are stable.
+    """
+    location_index, time_array = graph.time_array()
+    locations = list(demand)
+    indices = np.array([location_index[location_id] for location_id in locations])
+    weights = np.array([demand[location_id] for location_id in locations], dtype=float)
+
+    # distances[i, j]: travel time from candidate medoid i to start location j
+    distances = time_array[indices[:, None], indices[None, :]]
+    count('travel_time_lookups', distances.size)
+    num_medoids = min(num_medoids, len(locations))
+
+    medoids = []
+    nearest = np.full(len(locations), np.inf)
+    for _ in range(num_medoids):
+        costs = (np.minimum(nearest[None, :], distances) * weights[None, :]).sum(axis=1)
+        costs[medoids] = np.inf
+        medoid = int(np.argmin(costs))
+        medoids.append(medoid)
+        nearest = np.minimum(nearest, distances[medoid])
+
+    for _ in range(max_iterations):
+        assignment = np.argmin(distances[medoids], axis=0)
+        new_medoids = []
+
+        for cluster, medoid in enumerate(medoids):
+            members = np.flatnonzero(assignment == cluster)
+            if len(members) == 0:
+                new_medoids.append(medoid)
+                continue
+            costs = (distances[np.ix_(members, members)] * weights[None, members]).sum(axis=1)
+            new_medoids.append(int(members[np.argmin(costs)]))
+
+        if new_medoids == medoids:
+            break
+        medoids = new_medoids
+
+    return [locations[medoid] for medoid in medoids]
+
+def cluster_representatives(graph: Graph, demand: Dict[int, int]) -> List[int]:
+    """Demand weighted medoid of the riders' start locations in every cluster of the graph"""
+    representatives = []
+
+    for cluster_locations in graph.cluster_info.values():
+        cluster_demand = {location_id: demand[location_id] for location_id in cluster_locations if location_id in demand}
+        if cluster_demand:
+            representatives.extend(demand_medoids(graph, cluster_demand, 1))
+
+    return representatives
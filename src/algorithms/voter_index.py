@@ -0,0 +1,184 @@
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Tuple
+from models.agent import IterativeVotingAgent
+from models.graph import Graph
+from utils.tracing import count
+import heapq
+import math
+
+class VoterIndex:
+    """Index of the riders still being served by IterativeVoting2, keyed by
+    their eligibility thresholds
+
+    A waiting rider becomes eligible once the current departure time reaches
+    their optimal departure, or when the vehicle would arrive at their start
+    location within their beta window. An onboard rider becomes eligible once
+    the current departure time reaches their optimal arrival. Since departure
+    times never decrease during the voting procedure, riders past their
+    optimal departure/arrival stay eligible until their status changes.
+
+    Attributes
+    ----------
+    agents: List[IterativeVotingAgent]
+        Agents of the simulation instance, in voting order
+    graph: Graph
+        Graph used to compute travel times to the riders' start locations
+    wait_time: int
+        Waiting time increment of the voting procedure
+
+    Methods
+    ----------
+    select_voters(location_id, departure_time)
+        Eligible agents for the current location and departure time
+    idle_ticks(location_id, departure_time)
+        Number of wait_time increments until the next agent becomes eligible
+    board(agent)
+        Moves a picked up agent to the onboard riders
+    serve(agent)
+        Removes a dropped off agent from the index
+    """
+
+    def __init__(self, agents: List[IterativeVotingAgent], graph: Graph, wait_time: int) -> None:
+        self.agents = agents
+        self.graph = graph
+        self.wait_time = wait_time
+        self.__positions = {id(agent): position for position, agent in enumerate(agents)}
+        self.__serving = 0
+
+        # Riders ordered by their optimal departure / arrival
+        self.__departure_queue: List[Tuple[float, int]] = []
+        self.__arrival_queue: List[Tuple[float, int]] = []
+
+        # Riders past their optimal departure / arrival
+        self.__departed = set()
+        self.__arrived = set()
+
+        # Beta windows of the waiting riders, sorted per start location
+        self.__window_starts: Dict[int, List[float]] = dict()
+        self.__window_riders: Dict[int, List[Tuple[float, int]]] = dict()
+        self.__max_window = 0
+
+        # Travel times from the current location to every location,
+        # until the vehicle moves to another location
+        self.__location_index, self.__time_array = graph.time_array()
+        self.__travel_location = None
+        self.__travel_times = None
+
+        for position, agent in enumerate(agents):
+            rider = agent.rider
+            if agent.status == "waiting":
+                window_start = rider.optimal_departure - rider.beta*self.wait_time
+                self.__max_window = max(self.__max_window, 2*rider.beta*self.wait_time)
+                self.__departure_queue.append((rider.optimal_departure, position))
+                self.__window_riders.setdefault(rider.start_id, []).append((window_start, position))
+            elif agent.status == "onboard":
+                self.__arrival_queue.append((rider.optimal_arrival, position))
+            else:
+                continue
+            self.__serving += 1
+
+        heapq.heapify(self.__departure_queue)
+        heapq.heapify(self.__arrival_queue)
+        for start_id, riders in self.__window_riders.items():
+            riders.sort()
+            self.__window_starts[start_id] = [window_start for window_start, _ in riders]
+
+    def __len__(self) -> int:
+        return self.__serving
+
+    def select_voters(self, location_id, departure_time) -> List[IterativeVotingAgent]:
+        self.__update_thresholds(departure_time)
+        selected = self.__departed | self.__arrived
+
+        travel_times = self.__travel_times_from(location_id)
+
+        for start_id, window_starts in self.__window_starts.items():
+            expected_arrival_time = departure_time + travel_times[self.__location_index[start_id]]
+            riders = self.__window_riders[start_id]
+
+            # Only windows starting before the expected arrival, and
+            # not too long before, can contain it
+            first = bisect_left(window_starts, expected_arrival_time - self.__max_window - 1)
+            last = bisect_right(window_starts, expected_arrival_time)
+
+            for _, position in riders[first:last]:
+                rider = self.agents[position].rider
+                if expected_arrival_time >= rider.optimal_departure - rider.beta*self.wait_time and \
+                    expected_arrival_time < rider.optimal_departure + rider.beta*self.wait_time:
+                    selected.add(position)
+
+        return [self.agents[position] for position in sorted(selected)]
+
+    def idle_ticks(self, location_id, departure_time) -> int:
+        """Number of wait_time increments until the next agent becomes eligible at
+        the current location. The estimate never overshoots; if it falls short,
+        the voting procedure simply waits again.
+        """
+        event_times = []
+
+        self.__drop_boarded()
+        if self.__departure_queue:
+            event_times.append(self.__departure_queue[0][0])
+        if self.__arrival_queue:
+            event_times.append(self.__arrival_queue[0][0])
+
+        travel_times = self.__travel_times_from(location_id)
+
+        for start_id, window_starts in self.__window_starts.items():
+            travel_time = travel_times[self.__location_index[start_id]]
+            next_window = bisect_right(window_starts, departure_time + travel_time)
+            if next_window < len(window_starts):
+                event_times.append(window_starts[next_window] - travel_time)
+
+        if len(event_times) == 0:
+            return 1
+
+        return max(1, math.ceil((min(event_times) - departure_time) / self.wait_time - 1e-9))
+
+    def board(self, agent: IterativeVotingAgent) -> None:
+        position = self.__positions[id(agent)]
+        self.__remove_waiting(position)
+        heapq.heappush(self.__arrival_queue, (agent.rider.optimal_arrival, position))
+
+    def serve(self, agent: IterativeVotingAgent) -> None:
+        position = self.__positions[id(agent)]
+        self.__arrived.discard(position)
+        self.__serving -= 1
+
+    def __travel_times_from(self, location_id) -> List[float]:
+        if location_id != self.__travel_location:
+            self.__travel_location = location_id
+            self.__travel_times = self.__time_array[self.__location_index[location_id]].tolist()
+            count('travel_time_lookups', len(self.__travel_times))
+
+        return self.__travel_times
+
+    def __update_thresholds(self, departure_time) -> None:
+        self.__drop_boarded()
+        while self.__departure_queue and departure_time >= self.__departure_queue[0][0]:
+            _, position = heapq.heappop(self.__departure_queue)
+            self.__departed.add(position)
+            self.__drop_boarded()
+
+        while self.__arrival_queue and departure_time >= self.__arrival_queue[0][0]:
+            _, position = heapq.heappop(self.__arrival_queue)
+            self.__arrived.add(position)
+
+    def __drop_boarded(self) -> None:
+        # Riders picked up before their optimal departure are removed lazily
+        while self.__departure_queue and self.agents[self.__departure_queue[0][1]].status != "waiting":
+            heapq.heappop(self.__departure_queue)
+
+    def __remove_waiting(self, position: int) -> None:
+        rider = self.agents[position].rider
+        window_start = rider.optimal_departure - rider.beta*self.wait_time
+        self.__departed.discard(position)
+
+        riders = self.__window_riders[rider.start_id]
+        index = bisect_left(riders, (window_start, position))
+        del riders[index]
+        del self.__window_starts[rider.start_id][index]
+
+        if len(riders) == 0:
+            del self.__window_riders[rider.start_id]
+            del self.__window_starts[rider.start_id]
@@ -0,0 +1,203 @@
+"""Voting rules over ballot matrices
+
+A ballot matrix is a voters x positions array of candidate indices, where row v
+lists the candidates in the order of preference of voter v. A candidate may
+appear more than once in a ballot, in which case it scores at every position
+it appears at.
+"""
+from typing import Callable, List, Tuple
+import numpy as np
+
+def borda_weights(num_positions: int) -> np.ndarray:
+    return np.arange(num_positions - 1, -1, -1, dtype=float)
+
+def plurality_weights(num_positions: int) -> np.ndarray:
+    position_weights = np.zeros(num_positions)
+    position_weights[:1] = 1
+    return position_weights
+
+def harmonic_weights(num_positions: int) -> np.ndarray:
+    return 1 / np.arange(1, num_positions + 1)
+
+def ballots_from_utilities(utilities: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Ballot matrix from a voters x candidates utility matrix, ranking candidates by
+    decreasing utility and breaking ties randomly, along with the order in which
+    ties between winners are broken.
+
+    Every voter ranks the candidates as if it shuffled a candidate list shared by
+    all voters in place, then sorted it by decreasing utility. The shuffles are
+    drawn in voter order, each one rearranging the order left by the previous
+    voter, and the order left by the last voter is returned.
+    """
+    num_voters, num_candidates = utilities.shape
+
+    arrangement = np.arange(num_candidates)
+    arrangements = np.empty((num_voters, num_candidates), dtype=int)
+    for voter in range(num_voters):
+        np.random.shuffle(arrangement)
+        arrangements[voter] = arrangement
+
+    # Stable sort by decreasing utility, from each voter's shuffled candidate list
+    shuffled_utilities = np.take_along_axis(utilities, arrangements, axis=1)
+    order = np.argsort(-shuffled_utilities, axis=1, kind='stable')
+    return np.take_along_axis(arrangements, order, axis=1), arrangement
+
+def candidate_ballots(candidates: List[object], utilities: np.ndarray) -> Tuple[List[object], np.ndarray, np.ndarray]:
+    """Distinct candidates, along with the ballot matrix over their indices and the
+    order in which ties between them are broken (see ballots_from_utilities).
+    Column c of the utility matrix holds the utilities of candidates[c], and a
+    candidate listed more than once is ranked at every position it is listed at.
+    """
+    distinct_candidates = list(dict.fromkeys(candidates))
+    candidate_index = {candidate: index for index, candidate in enumerate(distinct_candidates)}
+    columns = np.array([candidate_index[candidate] for candidate in candidates], dtype=int)
+
+    ballots, tie_order = ballots_from_utilities(utilities)
+    return distinct_candidates, columns[ballots], columns[tie_order]
+
+def ranking_ballots(candidates: List[object], ranking_functions: List[Callable]) -> Tuple[List[object], np.ndarray, np.ndarray]:
+    """Distinct candidates, along with the ballot matrix over their indices and the
+    order in which ties between them are broken, from the ranking function of every
+    voter. Each ranking function returns the candidates it is given in order of
+    preference, and may reorder the list it is given, e.g. by shuffling it before sorting.
+    The ranking functions are given a copy of the candidates, and ties are broken
+    in the order it is left in by the last voter.
+    """
+    distinct_candidates = list(dict.fromkeys(candidates))
+    candidate_index = {candidate: index for index, candidate in enumerate(distinct_candidates)}
+    current_candidates = list(candidates)
+
+    ballots = np.empty((len(ranking_functions), len(candidates)), dtype=int)
+    for voter, ranking_function in enumerate(ranking_functions):
+        ballots[voter] = [candidate_index[candidate] for candidate in ranking_function(current_candidates)]
+
+    tie_order = np.array([candidate_index[candidate] for candidate in current_candidates], dtype=int)
+    return distinct_candidates, ballots, tie_order
+
+def positional_scores(ballots: np.ndarray, weights: np.ndarray, position_weights: np.ndarray, num_candidates: int) -> np.ndarray:
+    """Weighted score of every candidate of a positional voting rule.
+
+    Scores are accumulated voter by voter, in ballot order, so that they are
+    identical to summing the score of every ballot entry one at a time.
+    """
+    ballot_scores = np.asarray(weights, dtype=float)[:, None] * position_weights[None, :ballots.shape[1]]
+    return np.bincount(ballots.ravel(), weights=ballot_scores.ravel(), minlength=num_candidates)
+
+def tied_winners(scores: np.ndarray, tie_order: np.ndarray = None) -> np.ndarray:
+    """Indices of the candidates with the highest score, listed in tie_order if given"""
+    if tie_order is None:
+        return np.flatnonzero(scores == scores.max())
+    return tie_order[scores[tie_order] == scores.max()]
+
+def positional_winner(ballots: np.ndarray, weights: np.ndarray, position_weights: np.ndarray, num_candidates: int, tie_order: np.ndarray = None) -> int:
+    """Index of the winner of a positional voting rule, with ties broken randomly"""
+    scores = positional_scores(ballots, weights, position_weights, num_candidates)
+    return int(np.random.choice(tied_winners(scores, tie_order)))
+
+def instant_runoff_winner(ballots: np.ndarray, weights: np.ndarray, num_candidates: int) -> int:
+    """Index of the instant-runoff winner, with ties broken randomly.
+
+    The candidate ranked first by the lowest total weight is eliminated, until a
+    single candidate remains. Every ballot keeps a pointer to its top choice that
+    is not eliminated, and only the ballots of the eliminated candidate are moved
+    to their next choice.
+    """
+    ballots = ballots.tolist()
+    weights = np.asarray(weights, dtype=float)
+    eliminated = np.zeros(num_candidates, dtype=bool)
+    pointers = [0]*len(ballots)
+    tallies = np.zeros(num_candidates)
+    supporters = [[] for _ in range(num_candidates)]
+
+    for voter, ballot in enumerate(ballots):
+        tallies[ballot[0]] += weights[voter]
+        supporters[ballot[0]].append(voter)
+
+    for _ in range(num_candidates - 1):
+        standing = np.flatnonzero(~eliminated)
+        standing_tallies = tallies[standing]
+        loser = np.random.choice(standing[standing_tallies == standing_tallies.min()])
+        eliminated[loser] = True
+
+        for voter in supporters[loser]:
+            ballot = ballots[voter]
+            pointer = pointers[voter]
+            while eliminated[ballot[pointer]]:
+                pointer += 1
+            pointers[voter] = pointer
+
+            tallies[ballot[pointer]] += weights[voter]
+            supporters[ballot[pointer]].append(voter)
+
+        supporters[loser] = []
+
+    return int(np.flatnonzero(~eliminated)[0])
+
+def ballot_positions(ballots: np.ndarray, num_candidates: int) -> np.ndarray:
+    """Voters x candidates array of the best position of each candidate in each ballot"""
+    num_voters, num_positions = ballots.shape
+    positions = np.full((num_voters, num_candidates), num_positions)
+    voters = np.repeat(np.arange(num_voters), num_positions)
+    np.minimum.at(positions, (voters, ballots.ravel()), np.tile(np.arange(num_positions), num_voters))
+    return positions
+
+def pairwise_preferences(ballots: np.ndarray, weights: np.ndarray, num_candidates: int, block_size: int = 2**22) -> np.ndarray:
+    """Weighted pairwise preference matrix, where entry (a, b) is the total weight of the
+    voters that rank candidate a above candidate b.
+
+    Comparisons are evaluated for blocks of voters and candidates, holding at most
+    block_size of them in memory at once.
+    """
+    positions = ballot_positions(ballots, num_candidates)
+    weights = np.asarray(weights, dtype=float)
+    num_voters = len(positions)
+    preferences = np.zeros((num_candidates, num_candidates))
+
+    voter_block = max(1, min(num_voters, block_size // max(1, num_candidates)))
+    candidate_block = max(1, block_size // max(1, voter_block*num_candidates))
+
+    for voter_start in range(0, num_voters, voter_block):
+        block_positions = positions[voter_start:voter_start + voter_block]
+        block_weights = weights[voter_start:voter_start + voter_block]
+
+        for candidate_start in range(0, num_candidates, candidate_block):
+            rows = block_positions[:, candidate_start:candidate_start + candidate_block]
+            prefers = rows[:, :, None] < block_positions[:, None, :]
+            preferences[candidate_start:candidate_start + candidate_block] += np.tensordot(block_weights, prefers, axes=1)
+
+    return preferences
+
+def copeland_scores(preferences: np.ndarray) -> np.ndarray:
+    """Pairwise victories of every candidate, counting ties as half a victory"""
+    victories = (preferences > preferences.T).sum(axis=1)
+    ties = (preferences == preferences.T).sum(axis=1) - 1
+    return victories + ties/2
+
+def maximin_scores(preferences: np.ndarray) -> np.ndarray:
+    """Weakest pairwise support of every candidate against any other candidate"""
+    if len(preferences) < 2:
+        return np.zeros(len(preferences))
+
+    support = preferences.copy()
+    np.fill_diagonal(support, np.inf)
+    return support.min(axis=1)
+
+def schulze_scores(preferences: np.ndarray) -> np.ndarray:
+    """Number of candidates that every candidate beats or ties in strongest path strength,
+    so that the Schulze winners are the candidates with the highest score
+    """
+    num_candidates = len(preferences)
+    strengths = np.where(preferences > preferences.T, preferences, 0)
+    np.fill_diagonal(strengths, 0)
+
+    # Widest paths between every pair of candidates
+    for k in range(num_candidates):
+        strengths = np.maximum(strengths, np.minimum(strengths[:, k, None], strengths[None, k, :]))
+        np.fill_diagonal(strengths, 0)
+
+    return (strengths >= strengths.T).sum(axis=1)
+
+def pairwise_winner(ballots: np.ndarray, weights: np.ndarray, num_candidates: int, pairwise_scores: Callable) -> int:
+    """Index of the winner of a pairwise majority voting rule, with ties broken randomly"""
+    scores = pairwise_scores(pairwise_preferences(ballots, weights, num_candidates))
+    return int(np.random.choice(tied_winners(scores)))
@@ -1,92 +1,91 @@
-from typing import Callable, Set, List
+from typing import Callable, List, Tuple, Union
 import numpy as np
+from algorithms.voting_engine import borda_weights, candidate_ballots, copeland_scores, harmonic_weights, instant_runoff_winner, \
+    maximin_scores, pairwise_winner, plurality_weights, positional_winner, ranking_ballots, schulze_scores
 
 class VotingRules:
 
-    def borda_count(candidates: Set[object], ranking_functions: List[Callable], weights: List[float]):
+    def ballots(candidates: List[object], preferences: Union[np.ndarray, List[Callable]]) -> Tuple[List[object], np.ndarray, np.ndarray]:
+        """Distinct candidates, ballot matrix and tie break order of a vote (see
+        algorithms.voting_engine), from a voters x candidates utility matrix, or from
+        the ranking function of every voter
+        """
+        if isinstance(preferences, np.ndarray):
+            return candidate_ballots(candidates, preferences)
+        return ranking_ballots(candidates, preferences)
+
+    def borda_count(candidates: List[object], preferences: Union[np.ndarray, List[Callable]], weights: List[float]):
         """Borda count implementation
 
         Args:
             candidates (Union[List[Solution], List[int]]): Either List of Solutions or List of location_ids
-            ranking_functions (List[Callable]): Either solution ranking functions or location ranking functions from each rider
-            kwargs: Additional arguments that is supplied to the runtime ranking functions
+            preferences (Union[np.ndarray, List[Callable]]): Voters x candidates utility matrix, from which each rider ranks the candidates,
+                or the solution or location ranking function of each rider
+            weights (List[float]): Weight of each rider's ballot
 
         Returns:
             winner [Solution | int]: Winner candidate (either a Solution or location_id) according to voting rule
         """
-        num_of_candidates = len(candidates)
-        scores = {candidate: 0 for candidate in candidates}
-
-        for ranking_function, weight in zip(ranking_functions, weights):
-            ranked_candidates = ranking_function(candidates)
-            for rank_index, candidate in enumerate(ranked_candidates):
-                scores[candidate] += weight*((num_of_candidates - 1) - rank_index)
-        
-        # Use np.random to account for the fact that there could be ties
-        best_candidate = max(scores, key=scores.get)
-        best_score = scores[best_candidate]
-        indifferent_candidates = \
-            [candidate for candidate in candidates if scores[candidate] == best_score]
-
-        return np.random.choice(indifferent_candidates)
-
-    def popularity(candidates: Set[object], ranking_functions: List[Callable], weights: List[float]):
-
-        scores = {candidate: 0 for candidate in candidates}
-    
-        for ranking_function, weight in zip(ranking_functions, weights):
-            ranked_candidates = ranking_function(candidates)
-            first_choice = ranked_candidates[0]
-            scores[first_choice] += 1*weight
-        # Use np.random to account for ties
-        best_candidate = max(scores, key=scores.get)
-        best_score = scores[best_candidate]
-        indifferent_candidates = \
-            [candidate for candidate in candidates if scores[candidate] == best_score]
-            
-        return np.random.choice(indifferent_candidates)
-
-    def harmonic(candidates: Set[object], ranking_functions: List[Callable], weights: List[float]):
-        scores = {candidate: 0 for candidate in candidates}
-
-        for ranking_function, weight in zip(ranking_functions, weights):
-            ranked_candidates = ranking_function(candidates)
-            for rank_index, candidate in enumerate(ranked_candidates):
-                scores[candidate] += weight * (1/(rank_index+1)) # practically the main change between harmonic and borda
+        return VotingRules.positional(candidates, preferences, weights, borda_weights)
 
-        # Use np.random to account for the fact that there could be ties
-        best_candidate = max(scores, key=scores.get)
-        best_score = scores[best_candidate]
-        indifferent_candidates = \
-            [candidate for candidate in candidates if scores[candidate] == best_score]
+    def popularity(candidates: List[object], preferences: Union[np.ndarray, List[Callable]], weights: List[float]):
+        return VotingRules.positional(candidates, preferences, weights, plurality_weights)
 
-        return np.random.choice(indifferent_candidates)
+    def harmonic(candidates: List[object], preferences: Union[np.ndarray, List[Callable]], weights: List[float]):
+        return VotingRules.positional(candidates, preferences, weights, harmonic_weights)
+
+    def positional(candidates: List[object], preferences: Union[np.ndarray, List[Callable]], weights: List[float], position_weights: Callable):
+        """Positional voting rule, scoring each candidate by the weight of the positions
+        it is ranked at (see algorithms.voting_engine)
+
+        Args:
+            position_weights (Callable): Weight of every position, given the number of positions
 
-    def instant_runoff(candidates: Set[object], ranking_functions: List[Callable], weights: List[float]):
+        Returns:
+            winner [Solution | int]: Winner candidate according to voting rule
         """
-        the voting rule runs in |candidates| rounds. At each round, the least supported candidate is eliminated
-        I have not implemented a weighted version, as I cannot see how do we use them.
-        :param ranking_functions:
-        :param
-        :return:
+        distinct_candidates, ballots, tie_order = VotingRules.ballots(candidates, preferences)
+
+        # Use np.random to account for the fact that there could be ties
+        winner = positional_winner(ballots, weights, position_weights(len(candidates)), len(distinct_candidates), tie_order)
+        return distinct_candidates[winner]
+
+    def instant_runoff(candidates: List[object], preferences: Union[np.ndarray, List[Callable]], weights: List[float]):
+        """Instant-runoff voting. At each round, the candidate ranked first by the lowest
+        total weight is eliminated (ties broken randomly), until one candidate remains.
+
+        Args:
+            candidates (Union[List[Solution], List[int]]): Either List of Solutions or List of location_ids
+            preferences (Union[np.ndarray, List[Callable]]): Voters x candidates utility matrix, from which each rider ranks the candidates,
+                or the solution or location ranking function of each rider
+            weights (List[float]): Weight of each rider's ballot
+
+        Returns:
+            winner [Solution | int]: Winner candidate (either a Solution or location_id) according to voting rule
         """
+        distinct_candidates, ballots, _ = VotingRules.ballots(candidates, preferences)
+        winner = instant_runoff_winner(ballots, weights, len(distinct_candidates))
+        return distinct_candidates[winner]
+
+    def copeland(candidates: List[object], preferences: Union[np.ndarray, List[Callable]], weights: List[float]):
+        return VotingRules.pairwise(candidates, preferences, weights, copeland_scores)
+
+    def maximin(candidates: List[object], preferences: Union[np.ndarray, List[Callable]], weights: List[float]):
+        return VotingRules.pairwise(candidates, preferences, weights, maximin_scores)
 
-        Eliminated = set([])
-        ranked_candidates = []
-
-        for ranking_function in ranking_functions:
-            ranked_candidates.append(ranking_function(candidates))
-
-        while len(Eliminated) < len(candidates) - 1:
-            scores = {candidate: 0 for candidate in candidates if candidate not in Eliminated}
-            for ordering, weight in zip(ranked_candidates, weights):
-                not_eliminated_ordering = [i for i in ordering if i not in Eliminated]
-                first_choice = not_eliminated_ordering[0]
-                scores[first_choice] += 1 * weight
-            worst_candidate = min(scores, key=scores.get)
-            worst_score = scores[worst_candidate]
-
-            indifferent_candidates = [candidate for candidate in candidates.difference(Eliminated) if scores[candidate] == worst_score]
-            # choose randomly one of the candidates with the lowest score to be eliminated
-            Eliminated.add(np.random.choice(indifferent_candidates))
-        return candidates.difference(Eliminated).pop()
\ No newline at end of file
+    def schulze(candidates: List[object], preferences: Union[np.ndarray, List[Callable]], weights: List[float]):
+        return VotingRules.pairwise(candidates, preferences, weights, schulze_scores)
+
+    def pairwise(candidates: List[object], preferences: Union[np.ndarray, List[Callable]], weights: List[float], pairwise_scores: Callable):
+        """Pairwise majority voting rule, scoring each candidate from the weighted pairwise
+        preference matrix of the riders (see algorithms.voting_engine)
+
+        Args:
+            pairwise_scores (Callable): Score of every candidate, given the pairwise preference matrix
+
+        Returns:
+            winner [Solution | int]: Winner candidate according to voting rule
+        """
+        distinct_candidates, ballots, _ = VotingRules.ballots(candidates, preferences)
+        winner = pairwise_winner(ballots, weights, len(distinct_candidates), pairwise_scores)
+        return distinct_candidates[winner]
@@ -0,0 +1,169 @@
+"""Check of the file-based work queue with several concurrent workers
+
+Starts several worker processes on a temporary queue directory, each running the
+work loop of work_queue.py on synthetic tasks, and checks that every task
+completes exactly once:
+
+- workers race to claim the same pending tasks, and every task must be run once;
+- some workers die while running a task, leaving a claim that is no longer
+  refreshed, which must be moved back to the pending tasks once its lease expires
+  (requeue_stale) and run once more by another worker;
+- some tasks raise, and must be recorded as failed, without results, then run
+  once more when they are submitted again.
+
+Synthetic tasks sleep for a few milliseconds instead of generating and optimising
+passengers, so the check only takes a few seconds. The script exits with an error
+if any check fails. From the root of the repository:
+
+    python src/check_work_queue.py --tasks 40 --processes 4
+"""
+
+from experiment_planner import PassengerTask
+from pathlib import Path
+from typing import Dict, List, Tuple
+import work_queue
+import argparse
+import collections
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Outcome of the first run of a synthetic task. Later runs always complete
+OUTCOMES = ['complete', 'crash', 'fail']
+
+def synthetic_task(index: int, outcome: str) -> PassengerTask:
+    config = {'experiment_params': {}, 'outcome': outcome}
+    task = PassengerTask(f"passengers-{index}", "graph", config, index)
+    task.optimisations = [config]
+    task.solution_keys = [f"solution-{index}"]
+    return task
+
+def _run_synthetic_task(log_path: Path, task: PassengerTask, graph, graph_trace: Dict = None) -> List[Tuple[Dict[str, float], float, None]]:
+    # Appends of a single short line are atomic, so every run is logged once
+    with open(log_path, "a") as log:
+        log.write(f"{task.run_index} {os.getpid()}\n")
+    time.sleep(random.uniform(0.001, 0.02))
+
+    # Only the first run of a task has its outcome, whichever worker runs it
+    try:
+        Path(log_path.parent, f"first-{task.run_index}").touch(exist_ok=False)
+        first_run = True
+    except FileExistsError:
+        first_run = False
+
+    if first_run and task.config['outcome'] == 'crash':
+        # Dies without completing or failing the task, as a killed worker would
+        os._exit(1)
+    if first_run and task.config['outcome'] == 'fail':
+        raise RuntimeError(f"Task {task.run_index} failed")
+
+    return [({'run_index': float(task.run_index)}, 0.0, None)]
+
+def _synthetic_worker(queue_path: Path, log_path: Path, lease: float, poll: float) -> None:
+    # The work loop of the queue, with synthetic tasks instead of simulations
+    work_queue.run_passenger_task = lambda task, graph, graph_trace=None: _run_synthetic_task(log_path, task, graph, graph_trace)
+    work_queue.generate_graph = lambda config: None
+    work_queue.work(queue_path, lease, poll)
+
+def run_tasks(queue: work_queue.WorkQueue, tasks: Dict[str, PassengerTask], log_path: Path, processes: int, lease: float, poll: float, timeout: float) -> None:
+    """Submit tasks to the queue, and run them on worker processes until every task
+    has either completed or failed. Workers that die are replaced, as a node would
+    restart them.
+    """
+    queue.open()
+    for task in tasks.values():
+        queue.submit(task)
+
+    def start_worker() -> multiprocessing.Process:
+        worker = multiprocessing.Process(target=_synthetic_worker, args=(queue.path, log_path, lease, poll))
+        worker.start()
+        return worker
+
+    workers = [start_worker() for _ in range(processes)]
+    deadline = time.time() + timeout
+
+    try:
+        while not all(queue.result(id) is not None or queue.failure(id) is not None for id in tasks):
+            if time.time() > deadline:
+                raise TimeoutError(f"Tasks not done within {timeout} seconds")
+
+            workers = [worker if worker.is_alive() or worker.exitcode == 0 else start_worker() for worker in workers]
+            queue.requeue_stale(lease)
+            time.sleep(poll)
+    except BaseException:
+        # Workers only exit once the queue is closed and no task is pending
+        for worker in workers:
+            worker.terminate()
+        raise
+    finally:
+        queue.close()
+        for worker in workers:
+            worker.join()
+
+def check_runs(log_path: Path, expected: Dict[int, int]) -> List[str]:
+    """Tasks that did not run the expected number of times"""
+    runs = collections.Counter(int(line.split()[0]) for line in log_path.read_text().splitlines())
+    return [
+        f"Task {run_index} ran {runs[run_index]} time(s), expected {count}"
+        for run_index, count in sorted(expected.items()) if runs[run_index] != count
+    ]
+
+def check_queue(queue: work_queue.WorkQueue, tasks: Dict[str, PassengerTask], failed: List[int]) -> List[str]:
+    """Tasks whose results or failure are not the expected ones, and leftover claims"""
+    errors = []
+    for id, task in tasks.items():
+        results = queue.result(id)
+        if task.run_index in failed:
+            if results is not None or queue.failure(id) is None:
+                errors.append(f"Task {task.run_index} should have failed without results")
+        elif results is None or results[0][0] != {'run_index': float(task.run_index)}:
+            errors.append(f"Task {task.run_index} has results {results}")
+
+    for directory in ["pending", "claimed"]:
+        leftover = list(Path(queue.path, directory).glob("*.json"))
+        if leftover:
+            errors.append(f"{len(leftover)} task(s) left in {directory}")
+    return errors
+
+def check_work_queue(num_tasks: int, processes: int, lease: float, poll: float, timeout: float, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    outcomes = {index: rng.choices(OUTCOMES, weights=[0.7, 0.15, 0.15])[0] for index in range(num_tasks)}
+
+    with tempfile.TemporaryDirectory() as directory:
+        queue = work_queue.WorkQueue(Path(directory, "queue"))
+        log_path = Path(directory, "runs.log")
+        log_path.touch()
+        tasks = {work_queue.task_id(task): task for task in (synthetic_task(index, outcome) for index, outcome in outcomes.items())}
+
+        # Crashed tasks are run again after their lease expires, failed ones are not
+        run_tasks(queue, tasks, log_path, processes, lease, poll, timeout)
+        failed = [index for index, outcome in outcomes.items() if outcome == 'fail']
+        errors = check_runs(log_path, {index: 2 if outcome == 'crash' else 1 for index, outcome in outcomes.items()})
+        errors += check_queue(queue, tasks, failed)
+
+        # Submitting every task again only runs the failed ones
+        run_tasks(queue, tasks, log_path, processes, lease, poll, timeout)
+        errors += check_runs(log_path, {index: 1 if outcome == 'complete' else 2 for index, outcome in outcomes.items()})
+        errors += check_queue(queue, tasks, [])
+
+    print(f"{num_tasks} tasks on {processes} processes: "
+        f"{sum(outcome == 'crash' for outcome in outcomes.values())} crashed, {len(failed)} failed, {len(errors)} error(s)")
+    return errors
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that every task of a work queue completes exactly once with several workers")
+    parser.add_argument("--tasks", type=int, default=40, help="Number of tasks")
+    parser.add_argument("--processes", type=int, default=4, help="Number of worker processes")
+    parser.add_argument("--lease", type=float, default=1, help="Seconds after which a claim that is not refreshed is retried")
+    parser.add_argument("--poll", type=float, default=0.05, help="Seconds between checks of the queue")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds after which the check is abandoned")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the outcome of every task")
+    args = parser.parse_args()
+
+    errors = check_work_queue(args.tasks, args.processes, args.lease, args.poll, args.timeout, args.seed)
+    for error in errors:
+        print(error)
+    sys.exit(1 if errors else 0)
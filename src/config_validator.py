@@ -107,72 +107,169 @@ graph_schema = {
 }
 
 # Optimiser
+greedy_insert_params_schema = {
+    'iterations': {
+        'type': 'integer',
+        'min': 1
+    },
+    'final_voting_rule': {
+        'type': 'string',
+        'allowed': [
+            'borda_count',
+            'popularity',
+            'harmonic',
+            'instant_runoff',
+            'copeland',
+            'maximin',
+            'schulze',
+            'none'
+        ]
+    },
+    "objective": {
+        'type': 'string',
+        "allowed": [
+            'egalitarian',
+            'utilitarian',
+            'proportionality',
+            'avg_utility',
+            'gini_index'
+        ]
+    },
+    'orderings': {
+        'type': 'list',
+        'schema': {
+            'type': 'string',
+            'allowed': [
+                'optimal_departure',
+                'beta',
+                'trip_length',
+                'regret',
+                'random'
+            ]
+        }
+    },
+    'max_candidates': {
+        'type': 'integer',
+        'min': 1,
+        'dependencies': 'objective'
+    },
+    'vehicles': {
+        'type': 'integer',
+        'min': 1
+    }
+}
+
+local_search_schema = {
+    'type': 'dict',
+    'schema': {
+        'iterations': {
+            'type': 'integer',
+            'min': 1,
+            'required': True
+        },
+        'removal': {
+            'type': 'string',
+            'allowed': [
+                'random',
+                'related',
+                'worst'
+            ]
+        },
+        'removal_size': {
+            'type': 'integer',
+            'min': 1
+        }
+    }
+}
+
 greedy_insert_schema = {
     'algorithm': {
         'type': 'string',
-        'allowed': ['greedy insert', 'greedy insert ++']
+        'allowed': ['greedy insert']
+    },
+    'algorithm_params': {
+        'type': 'dict',
+        'schema': greedy_insert_params_schema
+    }
+}
+
+greedy_insert_plus_schema = {
+    'algorithm': {
+        'type': 'string',
+        'allowed': ['greedy insert ++']
     },
     'algorithm_params': {
         'type': 'dict',
         'schema': {
-            'iterations': {
-                'type': 'integer',
-                'min': 1
-            },
-            'final_voting_rule': {
-                'type': 'string',
-                'allowed': [
-                    'borda_count',
-                    'popularity',
-                    'none'
-                ]
-            },
-            "objective": {
-                'type': 'string',
-                "allowed": [
-                    'egalitarian',
-                    'utilitarian',
-                    'proportionality',
-                    'avg_utility',
-                    'gini_index'
-                ]
-            }
+            **greedy_insert_params_schema,
+            'local_search': local_search_schema
         }
+    }
+}
 
+iterative_voting_params_schema = {
+    'iterative_voting_rule': {
+        'type': 'string',
+        'allowed': ['borda_count', 'popularity', 'harmonic', 'instant_runoff', 'copeland', 'maximin', 'schulze']
+    },
+    'final_voting_rule': {
+        'type': 'string',
+        'allowed': ['borda_count', 'popularity', 'harmonic', 'instant_runoff', 'copeland', 'maximin', 'schulze']
+    },
+    'wait_time': {
+        'type': 'integer',
+        'min': 1,
+        'max': 5
+    },
+    'workers': {
+        'type': 'integer',
+        'min': 1
     }
 }
 
-iterative_voting_schema = {
+iterative_voting_1_schema = {
     'algorithm': {
         'type': 'string',
-        'allowed': ['iterative_voting_1', 'iterative_voting_2']
+        'allowed': ['iterative_voting_1']
     },
     'algorithm_params': {
         'type': 'dict',
         'schema': {
-            'iterative_voting_rule': {
-                'type': 'string',
-                'allowed': ['borda_count', 'popularity']
-            },
-            'final_voting_rule': {
+            **iterative_voting_params_schema,
+            'start_locations': {
                 'type': 'string',
-                'allowed': ['borda_count', 'popularity']
+                'allowed': ['all', 'sampled', 'clusters', 'medoids']
             },
-            'wait_time': {
+            'num_start_locations': {
                 'type': 'integer',
-                'min': 1,
-                'max': 5
+                'min': 1
+            },
+            'pruning': {
+                'type': 'boolean'
             }
         }
     }
 }
 
+iterative_voting_2_schema = {
+    'algorithm': {
+        'type': 'string',
+        'allowed': ['iterative_voting_2']
+    },
+    'algorithm_params': {
+        'type': 'dict',
+        'schema': iterative_voting_params_schema
+    }
+}
+
 
 optimiser_schema = {
     'type': 'dict', 
     'oneof_schema': [
         greedy_insert_schema,
-        iterative_voting_schema
+        greedy_insert_plus_schema,
+        iterative_voting_1_schema,
+        iterative_voting_2_schema
     ]
 }
 
@@ -183,6 +280,59 @@ experiment_schema = {
         'runs': {
             'type': 'integer',
             'min': 1
+        },
+        'workers': {
+            'type': 'integer',
+            'min': 1
+        },
+        'trace': {
+            'type': 'boolean'
+        },
+        'memory': {
+            'type': 'boolean'
+        },
+        'profile': {
+            'type': 'dict',
+            'schema': {
+                'mode': {
+                    'type': 'string',
+                    'allowed': ['deterministic', 'sampling'],
+                    'required': True
+                },
+                'runs': {
+                    'type': 'list',
+                    'schema': {
+                        'type': 'integer',
+                        'min': 0
+                    }
+                },
+                'interval': {
+                    'type': 'number',
+                    'min': 0.0001
+                }
+            }
+        }
+    }
+}
+
+sweep_schema = {
+    'type': 'dict',
+    'schema': {
+        'mode': {
+            'type': 'string',
+            'allowed': ['cartesian', 'zip']
+        },
+        'axes': {
+            'type': 'dict',
+            'required': True,
+            'keysrules': {
+                'type': 'string',
+                'regex': r'^(passenger_params|graph_params|optimiser_params|experiment_params)\..+'
+            },
+            'valuesrules': {
+                'type': 'list',
+                'minlength': 1
+            }
         }
     }
 }
@@ -197,7 +347,8 @@ config_schema = {
                 'passenger_params': passengers_schema,
                 'graph_params': graph_schema,
                 'optimiser_params': optimiser_schema,
-                'experiment_params': experiment_schema
+                'experiment_params': experiment_schema,
+                'sweep': sweep_schema
             }
         }
     }
@@ -0,0 +1,155 @@
+"""Parameter sweeps and the execution plan of a list of experiments
+
+An experiment may hold a `sweep`, with `axes` mapping dotted parameter paths to
+lists of values, combined as a `cartesian` product or `zip`ped together. Every
+combination becomes an experiment of its own.
+
+Experiments are planned as a dependency graph of artefacts:
+graph -> passengers -> optimised solution -> output. Artefacts are identified by
+the parameters they depend on, so an artefact shared by several experiments (the
+same graph, or the same passengers of a run when only optimiser parameters differ)
+is only computed once, and fanned out to every experiment that depends on it.
+"""
+
+from config_validator import ConfigException
+from typing import Dict, List, Tuple
+import copy
+import hashlib
+import itertools
+import json
+
+def expand_sweep(experiment: Dict) -> List[Dict]:
+    """Experiments of every combination of the sweep axes of an experiment, in order"""
+    if 'sweep' not in experiment:
+        return [experiment]
+
+    base = copy.deepcopy(experiment)
+    sweep = base.pop('sweep')
+    paths = list(sweep['axes'])
+    values = [sweep['axes'][path] for path in paths]
+
+    if sweep.get('mode', 'cartesian') == 'zip':
+        if len({len(axis_values) for axis_values in values}) > 1:
+            raise ConfigException({'sweep': [f"zip sweep axes must have the same number of values: {paths}"]})
+        combinations = zip(*values)
+    else:
+        combinations = itertools.product(*values)
+
+    experiments = []
+    for combination in combinations:
+        variant = copy.deepcopy(base)
+        for path, value in zip(paths, combination):
+            *parents, name = path.split('.')
+            params = variant
+            for parent in parents:
+                params = params.setdefault(parent, dict())
+            params[name] = copy.deepcopy(value)
+        experiments.append(variant)
+
+    return experiments
+
+def artefact_key(*params) -> str:
+    """Hash identifying an artefact by the parameters it depends on"""
+    encoded = json.dumps(params, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+def graph_key(experiment: Dict) -> str:
+    return artefact_key(experiment['graph_params'], experiment['seeds']['graph'])
+
+def passenger_key(experiment: Dict, run_index: int) -> str:
+    return artefact_key(graph_key(experiment), experiment['passenger_params'], experiment['seeds']['passengers'] + run_index)
+
+# Experiment parameters measuring runs, rather than changing their result
+MEASUREMENT_PARAMS = ['trace', 'profile', 'memory']
+
+def solution_key(experiment: Dict, run_index: int) -> str:
+    # Experiments measured differently do not share solutions, so that every run gets
+    # the measurements of its own experiment
+    return artefact_key(
+        passenger_key(experiment, run_index),
+        experiment['optimiser_params'],
+        experiment['seeds']['algorithm'],
+        [experiment['experiment_params'].get(param) for param in MEASUREMENT_PARAMS]
+    )
+
+class PassengerTask:
+    """Passengers of one run, and every distinct optimisation of them
+
+    Attributes
+    ----------
+    key: str
+        Passenger key of the task
+    graph_key: str
+        Graph the passengers are generated on
+    config: Dict
+        Experiment config used to generate the passengers
+    run_index: int
+        Run the passengers are generated for
+    optimisations: List[Dict]
+        Experiment configs used to optimise the passengers, one per distinct solution
+    solution_keys: List[str]
+        Solution key of every optimisation
+    outputs: List[List[Tuple[int, int]]]
+        (experiment index, run index) pairs every solution is fanned out to
+    """
+
+    def __init__(self, key: str, graph_key: str, config: Dict, run_index: int) -> None:
+        self.key = key
+        self.graph_key = graph_key
+        self.config = config
+        self.run_index = run_index
+        self.optimisations = []
+        self.solution_keys = []
+        self.outputs = []
+
+class ExperimentPlan:
+    """Artefacts to compute for the pending runs of a list of experiments
+
+    Attributes
+    ----------
+    graphs: Dict[str, Dict]
+        Experiment config used to generate every distinct graph, by graph key
+    tasks: List[PassengerTask]
+        Distinct passengers to generate, along with their optimisations
+
+    Methods
+    ----------
+    pending_runs(experiment_index)
+        Runs of an experiment computed by the plan
+    """
+
+    def __init__(self, experiments: List[Dict], completed: List[Dict[int, Tuple]] = None) -> None:
+        completed = completed or [dict() for _ in experiments]
+
+        self.graphs = dict()
+        self.tasks = []
+        self.__pending = [[] for _ in experiments]
+
+        tasks = dict()
+        solutions = dict()
+
+        for experiment_index, experiment in enumerate(experiments):
+            for run_index in range(experiment['experiment_params']['runs']):
+                if run_index in completed[experiment_index]:
+                    continue
+                self.__pending[experiment_index].append(run_index)
+
+                graph = graph_key(experiment)
+                self.graphs.setdefault(graph, experiment)
+
+                passengers = passenger_key(experiment, run_index)
+                if passengers not in tasks:
+                    tasks[passengers] = PassengerTask(passengers, graph, experiment, run_index)
+                    self.tasks.append(tasks[passengers])
+                task = tasks[passengers]
+
+                solution = solution_key(experiment, run_index)
+                if solution not in solutions:
+                    solutions[solution] = len(task.optimisations)
+                    task.optimisations.append(experiment)
+                    task.solution_keys.append(solution)
+                    task.outputs.append([])
+                task.outputs[solutions[solution]].append((experiment_index, run_index))
+
+    def pending_runs(self, experiment_index: int) -> List[int]:
+        return self.__pending[experiment_index]
@@ -4,6 +4,7 @@ import math
 from poisson_disc import Bridson_sampling
 import pandas as pd
 from haversine import haversine, Unit
+from utils.tracing import count
 
 
 def to_custom_graph(igraph):
@@ -65,8 +66,44 @@ class Graph:
             "min": min(non_zero_distances),
             "avg": np.mean(non_zero_distances)
         }
-        
+
+        # Dense travel time matrix, built on first use
+        self.__location_index = None
+        self.__time_array = None
+
+    def time_array(self):
+        """Dense travel time matrix, along with the row/column index of each location_id
+
+        Returns:
+            Tuple[Dict[int, int], np.ndarray]: location_id to index mapping, and the travel time
+            matrix. time_array[i, j] equals travel_time(source_id, target_id) for the location_ids
+            at indices i and j
+        """
+        if self.__time_array is None:
+            location_ids = list(dict.fromkeys(location_id for pair in self.time_matrix for location_id in pair))
+            location_index = {location_id: index for index, location_id in enumerate(location_ids)}
+            time_array = np.full((len(location_ids), len(location_ids)), np.nan)
+
+            for (source_id, target_id), travel_time in self.time_matrix.items():
+                time_array[location_index[source_id], location_index[target_id]] = travel_time
+
+            # Same fallback as travel_time(): use the reverse direction if a pair is missing
+            missing = np.isnan(time_array)
+            time_array[missing] = time_array.T[missing]
+
+            # Same error as travel_time() for a pair missing in both directions
+            missing = np.argwhere(np.isnan(time_array))
+            if len(missing):
+                source_index, target_index = missing[0]
+                raise KeyError(f"Source({location_ids[source_index]}) and Target({location_ids[target_index]}) not found in time matrix")
+
+            self.__location_index = location_index
+            self.__time_array = time_array
+
+        return self.__location_index, self.__time_array
+
     def travel_time(self, source_id, target_id):
+        count('travel_time_lookups')
         try:
             return self.time_matrix[(source_id, target_id)]
         except KeyError:
@@ -1,8 +1,9 @@
-from typing import Dict, Set
+from typing import Dict, Iterable, List, Set, Tuple
 from pyllist import dllist, dllistnode
-from utils.info_utils import solution_info
+from utils.info_utils import fleet_info, solution_info
 from models.graph import Graph
 import numpy as np
+import heapq
 from poverty import draw_lorenz
 from poverty import gini
 
@@ -52,6 +53,7 @@ class Solution:
         self.distance_travelled = None
         self.rider_utilities = dict()
         self.objectives = dict()
+        self.__tour = None
     
     def calculate_objectives(self):
         utils = [util for _, util in self.get_rider_utilities().items()]
@@ -61,12 +63,50 @@ class Solution:
         self.objectives['proportionality'] = np.std(utils)
         self.objectives['gini_index'] = gini(utils)
 
+    def copy(self) -> "Solution":
+        """Duplicate the tour and rider schedule of this Solution, so that the
+        copy can be modified without affecting this Solution
+        """
+        new_solution = Solution(self.agents, self.graph)
+
+        for node in self.llist.iternodes():
+            value = node.value
+            new_value = TourNodeValue(value.location_id, value.arrival_time, value.waiting_time)
+            new_value.departure_time = value.departure_time
+            new_value.pick_up = set(value.pick_up)
+            new_value.drop_off = set(value.drop_off)
+            new_solution.llist.append(dllistnode(new_value))
+
+        new_solution.rider_schedule = {key: dict(times) for key, times in self.rider_schedule.items()}
+        new_solution.rider_utilities = dict(self.rider_utilities)
+        new_solution.objectives = dict(self.objectives)
+        new_solution.distance_travelled = self.distance_travelled
+        return new_solution
+
     def head(self):
         return self.llist.first
     
     def tail(self):
         return self.llist.last
 
+    def vehicle_tours(self) -> List["Solution"]:
+        """Tours served by each vehicle. A Solution is a single vehicle tour"""
+        return [self]
+
+    def tour(self) -> Tuple[List[dllistnode], np.ndarray]:
+        """Tour nodes in visiting order, along with the graph index of their location_ids
+        (see Graph.time_array). Cached until the tour is modified.
+        """
+        if self.__tour is None or len(self.__tour[0]) != self.llist.size:
+            location_index, _ = self.graph.time_array()
+            nodes = list(self.llist.iternodes())
+            location_indices = np.fromiter(
+                (location_index[node.value.location_id] for node in nodes), dtype=int, count=len(nodes)
+            )
+            self.__tour = (nodes, location_indices)
+
+        return self.__tour
+
     def iterator(self, start_node: dllistnode=None):
         if start_node:
             return start_node.iternext()
@@ -79,6 +119,7 @@ class Solution:
 
         affected_node = ref_node.next
         new_node = self.llist.insert(new_node, after=ref_node)
+        self.__update_tour_after_insert(ref_node, new_node, offset=1)
         self.__update_after_insert(affected_node)
         return new_node
 
@@ -88,6 +129,7 @@ class Solution:
 
         affected_node = ref_node
         new_node = self.llist.insert(new_node, before=ref_node)
+        self.__update_tour_after_insert(ref_node, new_node, offset=0)
         self.__update_after_insert(affected_node)
         return new_node
     
@@ -96,8 +138,79 @@ class Solution:
             raise Exception("Invalid Insert")
 
         new_node = self.llist.append(new_node)
+        self.__update_tour_after_insert(None, new_node, offset=0)
         return new_node
     
+    def remove_rider(self, rider) -> List[dllistnode]:
+        """Remove rider from the tour. Nodes that are left without any pick ups
+        and drop offs are removed from the tour as well.
+
+        Returns:
+            List[dllistnode]: Nodes whose arrival or departure time changed
+        """
+        updated_nodes = []
+        node = self.head()
+
+        while node:
+            next_node = node.next
+            removed = False
+
+            if rider in node.value.pick_up:
+                node.value.remove_rider(rider, 'waiting')
+                removed = True
+            if rider in node.value.drop_off:
+                node.value.remove_rider(rider, 'onboard')
+                removed = True
+
+            if removed and not node.value.pick_up and not node.value.drop_off:
+                prev_node = node.prev
+                self.llist.remove(node)
+                self.__tour = None
+                updated_nodes.extend(self.__update_after_remove(prev_node, next_node))
+            node = next_node
+
+        return updated_nodes
+
+    def remove_superseded_riders(self) -> None:
+        """A rider that is picked up or dropped off at several nodes is scheduled
+        by the last of these nodes. Remove the rider from the earlier nodes, so
+        that every rider is picked up and dropped off exactly once. The rider
+        schedule is unaffected.
+        """
+        for tour in self.vehicle_tours():
+            picked_up = set()
+            dropped_off = set()
+
+            for node in reversed(tour.tour()[0]):
+                node.value.pick_up.difference_update(picked_up)
+                node.value.drop_off.difference_update(dropped_off)
+                picked_up.update(node.value.pick_up)
+                dropped_off.update(node.value.drop_off)
+
+    def update_rider_utilities(self, nodes: Iterable[dllistnode]) -> None:
+        """Delta update of the rider schedule and rider utilities. Only riders that
+        are picked up or dropped off at the supplied nodes are re-evaluated.
+        """
+        riders = set()
+
+        for node in nodes:
+            node.value.departure_time = int(node.value.departure_time)
+            node.value.waiting_time = int(node.value.waiting_time)
+            node.value.arrival_time = int(node.value.arrival_time)
+
+            for rider in node.value.pick_up:
+                self.rider_schedule['departure'][rider.id] = node.value.departure_time
+                riders.add(rider)
+
+            for rider in node.value.drop_off:
+                self.rider_schedule['arrival'][rider.id] = node.value.arrival_time
+                riders.add(rider)
+
+        for rider in riders:
+            departure_time = self.rider_schedule['departure'][rider.id]
+            arrival_time = self.rider_schedule['arrival'][rider.id]
+            self.rider_utilities[rider] = rider.utility(departure_time, arrival_time)
+
     def get_rider_utilities(self) -> Dict:
         if not self.rider_utilities:
             if not self.rider_schedule:
@@ -114,6 +227,7 @@ class Solution:
     def create_rider_schedule(self) -> Dict[str, Dict[int, int]]:
         distance_travelled = 0
         current_node = self.head()
+        self.rider_schedule = {"departure": dict(), "arrival": dict()}
 
         for node in self.llist.iternodes():
             node.value.departure_time = int(node.value.departure_time)
@@ -186,8 +300,152 @@ class Solution:
                     affected_node.value.waiting_time = new_waiting_time
                 break
 
+    def __update_tour_after_insert(self, ref_node, new_node, offset):
+
+        # Keep the cached tour in sync, instead of rebuilding it on the next scan
+        if self.__tour is None or len(self.__tour[0]) + 1 != self.llist.size:
+            self.__tour = None
+            return
+
+        nodes, location_indices = self.__tour
+        position = nodes.index(ref_node) + offset if ref_node else len(nodes)
+        location_index, _ = self.graph.time_array()
+        nodes = nodes[:position] + [new_node] + nodes[position:]
+        self.__tour = (nodes, np.insert(location_indices, position, location_index[new_node.value.location_id]))
+
+    def __update_after_remove(self, prev_node, next_node) -> List[dllistnode]:
+        updated_nodes = []
+
+        # The next node becomes the head of the tour
+        if next_node and not prev_node:
+            next_node.value.arrival_time = 0
+            next_node.value.waiting_time = next_node.value.departure_time
+            updated_nodes.append(next_node)
+
+        # Propagate the new arrival time, until a node can absorb the
+        # change with its waiting time
+        node = next_node if prev_node else None
+        while node:
+            prev = node.prev
+            travel_time = self.graph.travel_time(prev.value.location_id, node.value.location_id)
+            arrival_time = prev.value.departure_time + travel_time
+            updated_nodes.append(node)
+
+            if arrival_time > node.value.departure_time:
+                node.value.arrival_time = arrival_time
+                node.value.update_waiting_time(0)
+                node = node.next
+            else:
+                node.value.arrival_time = arrival_time
+                node.value.waiting_time = node.value.departure_time - arrival_time
+                break
+
+        return updated_nodes
+
     def __str__(self) -> str:
         return solution_info(self)
 
     def __repr__(self) -> str:
         return self.__str__()
+
+
+class Fleet(Solution):
+    """Solution served by a fleet of vehicles
+
+    Each vehicle serves its own tour, which is a Solution on its own. Rider
+    schedules and objectives are aggregated across the whole fleet.
+
+    Attributes
+    ----------
+    tours: List[Solution]
+        Tour of each vehicle
+    """
+
+    def __init__(self, agents: Set["Agent"], graph: Graph, tours: List[Solution]):
+        super().__init__(agents, graph)
+        self.tours = tours
+
+    def vehicle_tours(self) -> List[Solution]:
+        return self.tours
+
+    def copy(self) -> "Fleet":
+        new_fleet = Fleet(self.agents, self.graph, [tour.copy() for tour in self.tours])
+        new_fleet.rider_schedule = {key: dict(times) for key, times in self.rider_schedule.items()}
+        new_fleet.rider_utilities = dict(self.rider_utilities)
+        new_fleet.objectives = dict(self.objectives)
+        new_fleet.distance_travelled = self.distance_travelled
+        return new_fleet
+
+    def remove_rider(self, rider) -> List[dllistnode]:
+        updated_nodes = []
+        for tour in self.tours:
+            updated_nodes.extend(tour.remove_rider(rider))
+        return updated_nodes
+
+    def create_rider_schedule(self) -> Dict[str, Dict[int, int]]:
+        distance_travelled = 0
+        self.rider_schedule = {"departure": dict(), "arrival": dict()}
+
+        for tour in self.tours:
+            tour_schedule = tour.create_rider_schedule()
+            self.rider_schedule['departure'].update(tour_schedule['departure'])
+            self.rider_schedule['arrival'].update(tour_schedule['arrival'])
+            distance_travelled += tour.distance_travelled
+
+        self.distance_travelled = distance_travelled
+        return self.rider_schedule
+
+    def __str__(self) -> str:
+        return fleet_info(self)
+
+class SolutionPool:
+    """Streaming selection of the best Solutions by objective
+
+    Only the best `capacity` Solutions are retained, so that every other
+    Solution can be garbage collected as soon as it is superseded. If
+    capacity is None, every Solution is retained. A bounded pool needs an
+    objective to tell which Solutions are the best.
+
+    Methods
+    ----------
+    add(solution)
+        Offer a new Solution to the pool
+    best()
+        Best retained Solution. Ties are resolved in favour of the earliest Solution
+    solutions()
+        Retained Solutions, in the order they were added
+    """
+
+    def __init__(self, objective: str = None, capacity: int = None) -> None:
+        if capacity is not None and not objective:
+            raise ValueError("A SolutionPool with a capacity needs an objective to rank Solutions")
+        self.objective = objective
+        self.capacity = capacity
+        self.__heap = []
+        self.__count = 0
+
+    def add(self, solution: Solution) -> None:
+        score = solution.objectives[self.objective] if self.objective else 0
+
+        # Lower gini index is better, every other objective is maximised
+        if self.objective == "gini_index":
+            score = -score
+
+        # The root of the heap is the worst retained Solution. Amongst equal
+        # scores, the most recently added Solution is evicted first
+        entry = (score, -self.__count, solution)
+        self.__count += 1
+
+        if self.capacity is None or len(self.__heap) < self.capacity:
+            heapq.heappush(self.__heap, entry)
+        elif entry[:2] > self.__heap[0][:2]:
+            heapq.heapreplace(self.__heap, entry)
+
+    def best(self) -> Solution:
+        return max(self.__heap, key=lambda entry: entry[:2])[2]
+
+    def solutions(self) -> List[Solution]:
+        return [entry[2] for entry in sorted(self.__heap, key=lambda entry: -entry[1])]
+
+    def __len__(self) -> int:
+        return len(self.__heap)
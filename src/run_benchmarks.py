@@ -0,0 +1,337 @@
+"""Benchmarks of the optimiser hot paths
+
+Every benchmark times a fixed, seeded instance (graph, passengers and parameters)
+at several sizes, so that timings only depend on the code and the machine. Each
+benchmark is run a few times to warm up, then timed over several repeats, and the
+results can be saved as a JSON baseline and compared with a previous baseline,
+flagging the benchmarks that got slower than a threshold.
+
+Timings are only comparable on the same machine. A calibration loop is timed along
+with the benchmarks, and timings relative to it can be compared instead
+(--normalise) to roughly compare baselines of different machines.
+
+Run from the root of the repository, as the graph is read from ./dataset:
+
+    python src/run_benchmarks.py --output baseline.json
+    python src/run_benchmarks.py --baseline baseline.json --threshold 0.1
+"""
+
+from algorithms.optimiser import Optimiser
+from algorithms.voting_rules import VotingRules
+from models.passenger import PassengerGenerator
+from models.solution import Solution
+from simulation import prepare_config, generate_graph, generate_passengers
+from prettytable import PrettyTable
+from typing import Callable, Dict, List, Tuple
+import argparse
+import copy
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import numpy as np
+
+SEEDS = {'graph': 80, 'passengers': 67, 'algorithm': 82}
+
+BASE_CONFIG = {
+    'passenger_params': {
+        'num_passengers': None,
+        'service_hours': 24,
+        'alpha': 10,
+        'beta': 10,
+        'preference_distribution': 'peak_hours',
+        'inter_cluster_travelling': True
+    },
+    'graph_params': {
+        'dataset': 'westminster_hackney_stops',
+        'centroid_codes': ['490003384SA', '490009644E'],
+        'num_locations': None,
+        'short_avg_vehicle_speed': 19.76,
+        'long_avg_vehicle_speed': 48
+    },
+    'optimiser_params': {
+        'algorithm': None,
+        'algorithm_params': dict()
+    },
+    'experiment_params': {
+        'runs': 1
+    }
+}
+
+# Locations of each cluster of the graph, and number of passengers
+SIZES = {
+    'small': {'num_locations': [15, 15], 'num_passengers': 15},
+    'medium': {'num_locations': [30, 30], 'num_passengers': 30},
+    'large': {'num_locations': [60, 60], 'num_passengers': 60}
+}
+
+OPTIMISER_PARAMS = {
+    'greedy_insert': {
+        'algorithm': 'greedy insert',
+        'algorithm_params': {'final_voting_rule': 'borda_count', 'iterations': 5, 'objective': 'utilitarian'}
+    },
+    'greedy_insert_2': {
+        'algorithm': 'greedy insert ++',
+        'algorithm_params': {'final_voting_rule': 'borda_count', 'iterations': 5, 'objective': 'utilitarian', 'local_search': {'iterations': 10}}
+    },
+    'iterative_voting_1': {
+        'algorithm': 'iterative_voting_1',
+        'algorithm_params': {'iterative_voting_rule': 'borda_count', 'final_voting_rule': 'borda_count', 'wait_time': 5}
+    },
+    'iterative_voting_2': {
+        'algorithm': 'iterative_voting_2',
+        'algorithm_params': {'iterative_voting_rule': 'borda_count', 'final_voting_rule': 'borda_count', 'wait_time': 5}
+    }
+}
+
+VOTING_RULES = ['borda_count', 'popularity', 'harmonic', 'instant_runoff', 'copeland', 'maximin', 'schulze']
+
+# Number of travel time lookups timed by the travel time benchmark
+NUM_LOOKUPS = 10000
+
+class Instance:
+    """Seeded graph and passengers of one benchmark size
+
+    Attributes
+    ----------
+    size: str
+        Name of the size
+    config: Dict
+        Experiment config of the instance, without optimiser parameters
+    graph: Graph
+        Graph of the instance
+    passengers: List[Passenger]
+        Passengers of the instance
+
+    Methods
+    ----------
+    optimiser_config(algorithm)
+        Experiment config optimising the instance with one of OPTIMISER_PARAMS
+    solution()
+        Solution of the instance found by greedy insert, computed once
+    """
+
+    def __init__(self, size: str) -> None:
+        self.size = size
+        self.config = copy.deepcopy(BASE_CONFIG)
+        self.config['seeds'] = dict(SEEDS)
+        self.config['graph_params']['num_locations'] = SIZES[size]['num_locations']
+        self.config['passenger_params']['num_passengers'] = SIZES[size]['num_passengers']
+
+        self.graph = generate_graph(self.config)
+        self.passengers = generate_passengers(self.config, 0, self.graph)
+        self.__solution = None
+
+    def optimiser_config(self, algorithm: str) -> Dict:
+        config = copy.deepcopy(self.config)
+        config['optimiser_params'] = copy.deepcopy(OPTIMISER_PARAMS[algorithm])
+        return prepare_config(config)
+
+    def solution(self) -> Solution:
+        if self.__solution is None:
+            config = self.optimiser_config('greedy_insert')
+            optimiser = Optimiser(SEEDS['algorithm'], self.graph, self.passengers)
+            self.__solution = optimiser.optimise(config['optimiser_params'])
+        return self.__solution
+
+# Every benchmark prepares a repeat of an instance, and returns the function to time.
+# Preparation is not timed, and runs before every repeat
+
+def bench_travel_time(instance: Instance) -> Callable:
+    rng = np.random.default_rng(SEEDS['graph'])
+    locations = instance.graph.locations
+    pairs = [(locations[i], locations[j]) for i, j in rng.integers(len(locations), size=(NUM_LOOKUPS, 2)) if i != j]
+
+    def run() -> None:
+        travel_time = instance.graph.travel_time
+        for source, target in pairs:
+            travel_time(source, target)
+    return run
+
+def bench_passenger_generator(instance: Instance) -> Callable:
+    passenger_params = instance.config['passenger_params']
+    return lambda: PassengerGenerator(SEEDS['passengers'], instance.graph, passenger_params)
+
+def bench_optimiser(algorithm: str) -> Callable:
+    def prepare(instance: Instance) -> Callable:
+        config = instance.optimiser_config(algorithm)
+        # The optimiser seeds np.random, so every repeat optimises the same way
+        optimiser = Optimiser(SEEDS['algorithm'], instance.graph, instance.passengers)
+        return lambda: optimiser.optimise(config['optimiser_params'])
+    return prepare
+
+def bench_voting_rule(rule: str) -> Callable:
+    def prepare(instance: Instance) -> Callable:
+        # A voting round of every passenger over every location, with seeded utilities
+        rng = np.random.default_rng(SEEDS['algorithm'])
+        candidates = list(instance.graph.locations)
+        utilities = rng.random((len(instance.passengers), len(candidates)))
+        weights = list(rng.random(len(instance.passengers)))
+
+        np.random.seed(SEEDS['algorithm'])
+        voting_rule = getattr(VotingRules, rule)
+        return lambda: voting_rule(candidates, utilities, weights)
+    return prepare
+
+def bench_calculate_objectives(instance: Instance) -> Callable:
+    solution = instance.solution()
+    # Rider utilities are cached by the solution
+    solution.rider_utilities = dict()
+    return solution.calculate_objectives
+
+BENCHMARKS = {
+    'graph.travel_time': bench_travel_time,
+    'passenger_generator': bench_passenger_generator,
+    **{algorithm: bench_optimiser(algorithm) for algorithm in OPTIMISER_PARAMS},
+    **{f"voting_rules.{rule}": bench_voting_rule(rule) for rule in VOTING_RULES},
+    'solution.calculate_objectives': bench_calculate_objectives
+}
+
+def calibrate(repeats: int = 5) -> float:
+    """Fastest time of a fixed pure Python and numpy workload, to compare machines"""
+    def workload() -> None:
+        total = 0
+        for i in range(200000):
+            total += i % 7
+        np.sort(np.random.default_rng(0).random(200000))
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        workload()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def time_benchmark(prepare: Callable, instance: Instance, repeats: int, warmup: int, min_time: float) -> Tuple[List[float], int]:
+    """Time per call of every repeat of a benchmark, along with the number of calls per
+    repeat. Fast benchmarks are called several times per repeat, so that every repeat
+    lasts at least min_time seconds
+    """
+    def timed_call() -> float:
+        run = prepare(instance)
+        start = time.perf_counter()
+        run()
+        return time.perf_counter() - start
+
+    for _ in range(warmup):
+        timed_call()
+    calls = max(1, math.ceil(min_time / max(timed_call(), 1e-9)))
+
+    times = [sum(timed_call() for _ in range(calls)) / calls for _ in range(repeats)]
+    return times, calls
+
+def machine_info() -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'commit': commit
+    }
+
+def run_benchmarks(names: List[str], sizes: List[str], repeats: int = 5, warmup: int = 1, min_time: float = 0.02) -> Dict:
+    """Time the given benchmarks at the given sizes. Returns the results, keyed by
+    benchmark and size, along with the machine they were timed on
+    """
+    calibration = calibrate()
+    results = dict()
+
+    for size in sizes:
+        instance = Instance(size)
+        for name in names:
+            times, calls = time_benchmark(BENCHMARKS[name], instance, repeats, warmup, min_time)
+            results[f"{name}[{size}]"] = {
+                'benchmark': name,
+                'size': size,
+                'calls': calls,
+                'times': times,
+                'min': min(times),
+                'median': statistics.median(times),
+                'mean': statistics.mean(times),
+                'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+                'relative': min(times) / calibration
+            }
+            print(f"{name}[{size}]: {min(times)*1000:.3f} ms")
+
+    return {
+        'machine': machine_info(),
+        'settings': {'repeats': repeats, 'warmup': warmup, 'min_time': min_time},
+        'calibration': calibration,
+        'benchmarks': results
+    }
+
+def compare(results: Dict, baseline: Dict, threshold: float, normalise: bool = False) -> List[str]:
+    """Print the change of every benchmark since the baseline, and return the benchmarks
+    that got slower than the threshold, e.g. 0.1 for 10% slower. The fastest repeats are
+    compared, as they are the least affected by other processes
+    """
+    metric = 'relative' if normalise else 'min'
+    table = PrettyTable()
+    table.field_names = ["Benchmark", "Baseline (ms)", "Current (ms)", "Change", ""]
+    table.align["Benchmark"] = "l"
+
+    regressions = []
+    for key, result in results['benchmarks'].items():
+        if key not in baseline['benchmarks']:
+            table.add_row([key, "-", f"{result['min']*1000:.3f}", "-", "new"])
+            continue
+
+        previous = baseline['benchmarks'][key]
+        change = result[metric] / previous[metric] - 1
+        flag = ""
+        if change > threshold:
+            flag = "REGRESSION"
+            regressions.append(key)
+        elif change < -threshold:
+            flag = "faster"
+        table.add_row([key, f"{previous['min']*1000:.3f}", f"{result['min']*1000:.3f}", f"{100*change:+.1f}%", flag])
+
+    print(table)
+
+    machine = {key: value for key, value in results['machine'].items() if key != 'commit'}
+    baseline_machine = {key: value for key, value in baseline['machine'].items() if key != 'commit'}
+    if machine != baseline_machine and not normalise:
+        print("The baseline was timed on another machine, --normalise compares timings relative to the calibration loop")
+
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the optimiser hot paths")
+    parser.add_argument("benchmarks", nargs="*", help=f"Benchmarks to run (defaults to all): {', '.join(BENCHMARKS)}")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--repeats", type=int, default=5, help="Timed repeats of every benchmark")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed runs of every benchmark before the repeats")
+    parser.add_argument("--min-time", type=float, default=0.02, help="Minimum seconds per repeat, over several calls of fast benchmarks")
+    parser.add_argument("--output", default=None, help="JSON file to save the results to, as a baseline")
+    parser.add_argument("--baseline", default=None, help="JSON baseline to compare the results with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative slowdown flagged as a regression")
+    parser.add_argument("--normalise", action="store_true", help="Compare timings relative to the calibration loop")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    results = run_benchmarks(args.benchmarks or list(BENCHMARKS), args.sizes, args.repeats, args.warmup, args.min_time)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.normalise)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) slower than the baseline by more than {100*args.threshold:.0f}%")
+            sys.exit(1)
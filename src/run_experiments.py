@@ -0,0 +1,160 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from config_validator import validate_yaml
+from experiment_planner import ExperimentPlan, PassengerTask, expand_sweep, graph_key
+from algorithms.candidate_pool import disable_nested_pool
+from simulation import prepare_config, generate_graph, generate_passengers, optimise_passengers, new_tracer, shared_tracer, peak_memory
+from utils.output_writer import write_simulation_output, write_trace_output
+from utils.checkpoint import Checkpoint
+from utils.tracing import merge_traces, span, tracing
+from utils.profiling import set_profile, write_profile_output
+from models.graph import Graph
+from typing import Dict, List, Optional, Tuple
+import argparse
+import copy
+import os
+import yaml
+
+# Graphs of the planned experiments, shared by the tasks of the current worker process
+_graphs = None
+
+def _initialise_worker(graphs: Dict) -> None:
+    global _graphs
+    _graphs = graphs
+    disable_nested_pool()
+
+def _run_passenger_task(task: PassengerTask) -> List[Tuple[Dict[str, float], float, Optional[Dict]]]:
+    return run_passenger_task(task, _graphs[task.graph_key])
+
+def run_passenger_task(task: PassengerTask, graph: Graph, task_trace: Dict = None) -> List[Tuple[Dict[str, float], float, Optional[Dict]]]:
+    """Generate the passengers of a task once, and run every optimisation of them.
+    Returns the objectives, elapsed time and trace of every optimisation. The trace of
+    a traced optimisation includes the passengers it shares, and task_trace if given.
+    """
+    passenger_tracer = shared_tracer(task.optimisations)
+    with tracing(passenger_tracer):
+        passengers = generate_passengers(task.config, task.run_index, graph)
+
+    shared_traces = [trace for trace in [task_trace, passenger_tracer.summary() if passenger_tracer else None] if trace]
+
+    results = []
+    for config in task.optimisations:
+        run_tracer = new_tracer(config)
+        with tracing(run_tracer):
+            solution, elapsed = optimise_passengers(config, graph, passengers, task.run_index)
+        trace = merge_traces(*shared_traces, run_tracer.summary()) if run_tracer else None
+        results.append((solution.objectives, elapsed, trace))
+
+    return results
+
+def load_experiments(config_file) -> List[Dict]:
+    """Validated experiments of a config file, with their sweeps expanded, each with its
+    own copy of the seeds
+    """
+    with open(config_file, "r") as f:
+        config = yaml.safe_load(f)
+
+    validate_yaml(config)
+
+    # Swept values are validated once they are in place
+    expanded = [variant for experiment in config['experiments'] for variant in expand_sweep(experiment)]
+    validate_yaml({'seeds': config['seeds'], 'experiments': expanded})
+
+    experiments = []
+    for experiment in expanded:
+        experiment = copy.deepcopy(experiment)
+        experiment['seeds'] = copy.deepcopy(config['seeds'])
+        experiments.append(prepare_config(experiment))
+
+    return experiments
+
+def write_experiment_output(experiment: Dict, runs: Dict[int, Tuple[Dict[str, float], float, Optional[Dict]]], graph_trace: Dict = None) -> None:
+    """Write the output of an experiment from the objectives, elapsed time and trace of its
+    runs, by run index. The trace of a traced experiment also includes graph_trace, if given.
+    """
+    num_runs = experiment['experiment_params']['runs']
+    objectives = [runs[run][0] for run in range(num_runs)]
+    elapsed = [runs[run][1] for run in range(num_runs)]
+    traces = [runs[run][2] for run in range(num_runs)]
+
+    output_tracer = new_tracer(experiment)
+    with tracing(output_tracer), span('output'):
+        output_dir = write_simulation_output(experiment, objectives, elapsed, peak_memory(experiment, traces))
+
+    if output_tracer:
+        experiment_trace = merge_traces(*[trace for trace in [graph_trace, output_tracer.summary()] if trace])
+        write_trace_output(output_dir, experiment_trace, traces)
+    write_profile_output(output_dir, experiment)
+
+def run_experiments(experiments: List[Dict], workers: int = None) -> None:
+    """Run every run of every experiment on a pool of worker processes, and write the
+    output of each experiment in order, as soon as all of its runs are done. Runs
+    recorded in the checkpoint of an experiment are not run again.
+
+    Graphs, passengers and solutions shared by several experiments are computed once,
+    following an ExperimentPlan. Each distinct graph is generated in this process and
+    handed to each worker once, and each task generates the passengers of one run
+    before running every optimisation of them.
+    """
+    workers = workers or os.cpu_count() or 1
+
+    checkpoints = [Checkpoint(experiment) for experiment in experiments]
+    completed = [checkpoint.completed() for checkpoint in checkpoints]
+    plan = ExperimentPlan(experiments, completed)
+
+    graphs = dict()
+    graph_traces = dict()
+    for key, config in plan.graphs.items():
+        graph_tracer = shared_tracer([experiment for experiment in experiments if graph_key(experiment) == key])
+        with tracing(graph_tracer):
+            graphs[key] = generate_graph(config)
+        graph_traces[key] = graph_tracer.summary() if graph_tracer else None
+
+    def write_ready_experiments(next_experiment: int) -> int:
+        """Write the output of the experiments whose runs are all done, in order,
+        and return the index of the first experiment still waiting for runs
+        """
+        for id in range(next_experiment, len(experiments)):
+            runs = completed[id]
+            if any(run not in runs for run in plan.pending_runs(id)):
+                return id
+
+            write_experiment_output(experiments[id], runs, graph_traces.get(graph_key(experiments[id])))
+            checkpoints[id].remove()
+            print(f"Experiment {id+1} Done")
+        return len(experiments)
+
+    next_experiment = write_ready_experiments(0)
+    error = None
+
+    with ProcessPoolExecutor(workers, initializer=_initialise_worker, initargs=(graphs,)) as pool:
+        task_futures = {pool.submit(_run_passenger_task, task): task for task in plan.tasks}
+
+        # Runs are recorded in the checkpoints by this thread as soon as their task
+        # completes, in any order, so that no record can follow the removal of a checkpoint
+        for future in as_completed(task_futures):
+            if future.exception() is not None:
+                # Keep recording the other tasks, so that a new attempt only runs the failed ones
+                error = error or future.exception()
+                continue
+
+            for result, outputs in zip(future.result(), task_futures[future].outputs):
+                for experiment_index, run_index in outputs:
+                    checkpoints[experiment_index].record(run_index, *result)
+                    completed[experiment_index][run_index] = result
+
+            next_experiment = write_ready_experiments(next_experiment)
+
+    if error is not None:
+        raise error
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the experiments of a config file")
+    parser.add_argument("config_file", nargs="?", default="config.yaml")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (defaults to the number of CPUs)")
+    parser.add_argument("--profile", choices=["deterministic", "sampling"], default=None, help="Profile the optimiser of every experiment")
+    parser.add_argument("--profile-runs", type=int, nargs="+", default=None, help="Runs to profile (defaults to every run)")
+    args = parser.parse_args()
+
+    experiments = load_experiments(args.config_file)
+    set_profile(experiments, args.profile, args.profile_runs)
+    run_experiments(experiments, args.workers)
@@ -0,0 +1,294 @@
+"""Scaling study of the optimisers
+
+Sweeps the number of passengers and the number of locations of seeded synthetic
+instances geometrically, one axis at a time with the other one fixed, and optimises
+every instance with each chosen algorithm. Every point runs in a subprocess, whose
+optimisation is stopped after a time cap, and once a point of an axis exceeds the
+cap (or fails), the larger points of that axis are skipped for that algorithm.
+
+The time taken by every phase and the memory used by every point are recorded, and
+a power law (time ~ coefficient * size^exponent) is fitted to each algorithm, axis
+and metric by least squares on a log-log scale. The optimisers only work on the
+graph pruned to the locations of the passengers, so the optimisation time barely
+depends on the number of locations: the time taken to generate and prune the graph
+is fitted on that axis as well. Results are written as CSV tables and plots:
+
+    python src/run_scaling_study.py --algorithms greedy_insert iterative_voting_2 --time-cap 300
+"""
+
+from config_validator import validate_yaml
+from run_benchmarks import BASE_CONFIG, OPTIMISER_PARAMS, SEEDS
+from simulation import prepare_config, generate_graph, generate_passengers, optimise_passengers
+from utils.tracing import Tracer, peak_rss_mb, peak_traced_memory_mb, tracing
+import utils.graph_utils as graph_utils
+from prettytable import PrettyTable
+from pathlib import Path
+from typing import Dict, List
+import argparse
+import copy
+import csv
+import math
+import multiprocessing
+import time
+import traceback
+import numpy as np
+
+GRAPH_PARAMS = {
+    'clusters': 4,
+    'min_location_distance': 100,
+    'short_avg_vehicle_speed': 19.76,
+    'long_avg_vehicle_speed': 48
+}
+
+# Instance size varied by every axis
+AXES = {'passengers': 'num_passengers', 'locations': 'num_locations'}
+
+# Measures fitted against the instance size of every axis
+METRICS = {
+    'passengers': ['optimise_time', 'memory_mb'],
+    'locations': ['graph_time', 'prune_graph_time', 'optimise_time', 'memory_mb']
+}
+
+FIELDNAMES = [
+    'algorithm',
+    'axis',
+    'num_passengers',
+    'num_locations',
+    'status',
+    'graph_time',
+    'passengers_time',
+    'prune_graph_time',
+    'optimise_time',
+    'wall_time',
+    'memory_mb',
+    'peak_rss_mb'
+]
+
+def geometric_sizes(start: int, stop: int, points: int) -> List[int]:
+    return sorted(set(int(size) for size in np.geomspace(start, stop, points).round()))
+
+def grid_size(num_locations: int, clusters: int, min_location_distance: float) -> float:
+    """Smallest grid size that fits the locations, as checked by the config validator"""
+    locations_per_cluster = num_locations / clusters
+    rings = 0
+    capacity = 0
+    while capacity < locations_per_cluster:
+        rings += 1
+        capacity += math.ceil(2 * np.pi * rings)
+
+    # The validator only fills the inner half of the rings of a cluster
+    return 4 * rings * min_location_distance * math.ceil(np.sqrt(clusters))
+
+def instance_config(algorithm: str, num_passengers: int, num_locations: int) -> Dict:
+    """Experiment config of one point of the study, on a synthetic graph"""
+    graph_params = dict(GRAPH_PARAMS)
+    graph_params['num_locations'] = num_locations
+    graph_params['grid_size'] = grid_size(num_locations, graph_params['clusters'], graph_params['min_location_distance'])
+
+    config = {
+        'passenger_params': {**copy.deepcopy(BASE_CONFIG['passenger_params']), 'num_passengers': num_passengers},
+        'graph_params': graph_params,
+        'optimiser_params': copy.deepcopy(OPTIMISER_PARAMS[algorithm]),
+        'experiment_params': {'runs': 1}
+    }
+    validate_yaml({'seeds': dict(SEEDS), 'experiments': [config]})
+
+    config['seeds'] = dict(SEEDS)
+    return prepare_config(config)
+
+def _measure_point(config: Dict, connection) -> None:
+    try:
+        tracer = Tracer()
+        with tracing(tracer):
+            graph = generate_graph(config)
+            passengers = generate_passengers(config, 0, graph)
+            # The time cap only applies from here
+            connection.send({'status': 'optimising'})
+            _, elapsed = optimise_passengers(config, graph, passengers)
+        spans = tracer.summary()['spans']
+
+        # Sent before the memory pass, so that the timings are kept if it is stopped
+        connection.send({
+            'status': 'done',
+            'graph_time': spans['graph']['time'],
+            'passengers_time': spans['passengers']['time'],
+            'prune_graph_time': spans['prune_graph']['time'],
+            'optimise_time': elapsed,
+            'peak_rss_mb': peak_rss_mb()
+        })
+
+        # Tracing allocations slows the optimiser down, so memory is measured by a
+        # second, identical pass
+        del graph, passengers
+        memory_tracer = Tracer(memory=True)
+        with tracing(memory_tracer):
+            graph = generate_graph(config)
+            passengers = generate_passengers(config, 0, graph)
+            connection.send({'status': 'optimising'})
+            optimise_passengers(config, graph, passengers)
+
+        connection.send({'status': 'done', 'memory_mb': peak_traced_memory_mb(memory_tracer.summary())})
+    except Exception:
+        connection.send({'status': 'error', 'error': traceback.format_exc()})
+
+def _receive_pass(receiver, time_cap: float) -> Dict:
+    """Result of a pass of the measuring subprocess, which has time_cap seconds to send
+    it once the optimisation starts. Raises EOFError if the subprocess exits first.
+    """
+    message = receiver.recv()
+    if message['status'] != 'optimising':
+        return message
+
+    if not receiver.poll(time_cap):
+        return {'status': 'timeout'}
+    return receiver.recv()
+
+def measure_point(config: Dict, time_cap: float) -> Dict:
+    """Generate and optimise an instance in a subprocess, which is stopped if the
+    optimisation takes more than time_cap seconds. The memory of the point is the
+    peak memory allocated while generating and optimising the instance again, as
+    traced by tracemalloc, under the same cap. It is missing if that pass is stopped
+    or fails. The peak resident set size is the high-water mark of the subprocess
+    before the memory pass.
+    """
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_measure_point, args=(config, sender))
+
+    start = time.perf_counter()
+    process.start()
+    # Only the subprocess can send, so that the receiver sees it exit
+    sender.close()
+
+    try:
+        result = _receive_pass(receiver, time_cap)
+    except EOFError:
+        # Killed, e.g. when running out of memory
+        process.join()
+        result = {'status': 'error', 'error': f"Exited with code {process.exitcode}"}
+
+    if result['status'] == 'done':
+        try:
+            result['memory_mb'] = _receive_pass(receiver, time_cap).get('memory_mb')
+        except EOFError:
+            result['memory_mb'] = None
+
+    if process.is_alive():
+        process.terminate()
+    process.join()
+    result['wall_time'] = time.perf_counter() - start
+    return result
+
+def run_study(algorithms: List[str], sizes: Dict[str, List[int]], base_passengers: int, base_locations: int, time_cap: float) -> List[Dict]:
+    """Result of every point of the study, by algorithm, axis and size"""
+    results = []
+
+    for algorithm in algorithms:
+        for axis, axis_sizes in sizes.items():
+            stopped = False
+            for size in axis_sizes:
+                num_passengers = size if axis == 'passengers' else base_passengers
+                num_locations = size if axis == 'locations' else base_locations
+                point = {'algorithm': algorithm, 'axis': axis, 'num_passengers': num_passengers, 'num_locations': num_locations}
+
+                if stopped:
+                    results.append({**point, 'status': 'skipped'})
+                    continue
+
+                result = measure_point(instance_config(algorithm, num_passengers, num_locations), time_cap)
+                results.append({**point, **result})
+                print(f"{algorithm} {num_passengers} passengers, {num_locations} locations: {result['status']} ({result['wall_time']:.1f}s)")
+
+                if result['status'] != 'done':
+                    if 'error' in result:
+                        print(result['error'])
+                    # Larger instances would not do any better
+                    stopped = True
+
+    return results
+
+def fit_exponents(results: List[Dict]) -> List[Dict]:
+    """Power law fitted to every metric of every algorithm and axis, from the points that
+    completed, on a log-log scale
+    """
+    fits = []
+    groups = dict.fromkeys((result['algorithm'], result['axis']) for result in results)
+
+    for algorithm, axis in groups:
+        for metric in METRICS[axis]:
+            points = [
+                (result[AXES[axis]], result[metric]) for result in results
+                if result['algorithm'] == algorithm and result['axis'] == axis and result['status'] == 'done'
+                    and result[metric] is not None and result[metric] > 0
+            ]
+            if len({size for size, _ in points}) < 2:
+                continue
+
+            x = np.log([size for size, _ in points])
+            y = np.log([value for _, value in points])
+            exponent, intercept = np.polyfit(x, y, 1)
+            residuals = y - (exponent * x + intercept)
+            total = np.sum((y - y.mean())**2)
+
+            fits.append({
+                'algorithm': algorithm,
+                'axis': axis,
+                'metric': metric,
+                'exponent': exponent,
+                'coefficient': np.exp(intercept),
+                'r_squared': 1 - np.sum(residuals**2) / total if total > 0 else 1.0,
+                'points': len(points),
+                'max_size': max(size for size, _ in points)
+            })
+
+    return fits
+
+def write_study_output(output_dir, results: List[Dict], fits: List[Dict]) -> None:
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    with Path(output_dir, "scaling_results.csv").open('w') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(results)
+
+    fit_fieldnames = ['algorithm', 'axis', 'metric', 'exponent', 'coefficient', 'r_squared', 'points', 'max_size']
+    with Path(output_dir, "scaling_exponents.csv").open('w') as f:
+        writer = csv.DictWriter(f, fieldnames=fit_fieldnames)
+        writer.writeheader()
+        writer.writerows(fits)
+
+    done = [result for result in results if result['status'] == 'done']
+    for axis in AXES:
+        axis_results = [result for result in done if result['axis'] == axis]
+        if not axis_results:
+            continue
+        for metric in METRICS[axis]:
+            metric_results = [result for result in axis_results if result[metric] is not None and result[metric] > 0]
+            metric_fits = [fit for fit in fits if fit['axis'] == axis and fit['metric'] == metric]
+            if metric_results:
+                graph_utils.plot_scaling(metric_results, AXES[axis], metric, metric_fits, str(Path(output_dir, f"scaling_{axis}_{metric}.png")))
+
+    table = PrettyTable()
+    table.field_names = ["Algorithm", "Axis", "Metric", "Exponent", "R squared", "Points", "Largest size"]
+    for fit in fits:
+        table.add_row([fit['algorithm'], fit['axis'], fit['metric'], f"{fit['exponent']:.2f}", f"{fit['r_squared']:.3f}", fit['points'], fit['max_size']])
+    print(table)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure how the optimisers scale with the number of passengers and locations")
+    parser.add_argument("--algorithms", nargs="+", choices=list(OPTIMISER_PARAMS), default=['greedy_insert', 'iterative_voting_2'])
+    parser.add_argument("--passengers", type=int, nargs=2, default=[50, 10000], metavar=("MIN", "MAX"), help="Range of the number of passengers")
+    parser.add_argument("--locations", type=int, nargs=2, default=[50, 5000], metavar=("MIN", "MAX"), help="Range of the number of locations")
+    parser.add_argument("--points", type=int, default=6, help="Geometrically spaced sizes per axis")
+    parser.add_argument("--base-passengers", type=int, default=50, help="Number of passengers while the number of locations varies")
+    parser.add_argument("--base-locations", type=int, default=100, help="Number of locations while the number of passengers varies")
+    parser.add_argument("--time-cap", type=float, default=300, help="Seconds after which a point is stopped")
+    parser.add_argument("--output", default="./scaling_study", help="Output folder of the tables and plots")
+    args = parser.parse_args()
+
+    sizes = {
+        'passengers': geometric_sizes(*args.passengers, args.points),
+        'locations': geometric_sizes(*args.locations, args.points)
+    }
+    results = run_study(args.algorithms, sizes, args.base_passengers, args.base_locations, args.time_cap)
+    write_study_output(args.output, results, fit_exponents(results))
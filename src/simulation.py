@@ -1,61 +1,179 @@
 from models.graph import DatasetGraphGenerator, SyntheticGraphGenerator
-from models.passenger import PassengerGenerator
+from models.passenger import Passenger, PassengerGenerator
+from models.solution import Solution
+from models.graph import Graph
 from algorithms.optimiser import Optimiser
+from algorithms.candidate_pool import disable_nested_pool
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
 import time
 import yaml
 
-from utils.output_writer import write_simulation_output
+from utils.output_writer import write_simulation_output, write_trace_output
+from utils.checkpoint import Checkpoint
+from utils.tracing import Tracer, peak_traced_memory_mb, span, tracing
+from utils.profiling import RunProfiler, write_profile_output
+
+def prepare_config(config: Dict) -> Dict:
+    """Pass experiment wide parameters on to the optimiser parameters"""
+    config['optimiser_params']['algorithm_params']['service_hours'] = config['passenger_params']['service_hours']
+    return config
+
+def tracks_memory(config: Dict) -> bool:
+    return config['experiment_params'].get('memory', False)
+
+def is_traced(config: Dict) -> bool:
+    # Memory is tracked by the tracer, so tracking memory also traces the experiment
+    return config['experiment_params'].get('trace', False) or tracks_memory(config)
+
+def new_tracer(config: Dict) -> Optional[Tracer]:
+    """Tracer of a run or experiment, if the experiment is traced"""
+    return Tracer(tracks_memory(config)) if is_traced(config) else None
+
+def shared_tracer(configs: List[Dict]) -> Optional[Tracer]:
+    """Tracer of an artefact shared by several experiments, if any of them is traced"""
+    if not any(is_traced(config) for config in configs):
+        return None
+    return Tracer(any(tracks_memory(config) for config in configs))
+
+def peak_memory(config: Dict, traces: List[Optional[Dict]]) -> Optional[List[float]]:
+    """Peak memory in MB allocated by every run, from their traces, if the experiment
+    tracks memory
+    """
+    if not tracks_memory(config):
+        return None
+    # The graph is shared by the runs, so its peak is not part of any run, even when
+    # it is traced by the run that generated it
+    return [peak_traced_memory_mb(trace, excluded=['graph']) for trace in traces]
+
+def generate_graph(config: Dict) -> Graph:
+    """Graph of an experiment, identical for every run of the experiment"""
+    graph_params = config['graph_params']
+
+    with span('graph'):
+        try:
+            graph_params['dataset']
+            generator = DatasetGraphGenerator(graph_params)
+            return generator.graph
+        except:
+            generator = SyntheticGraphGenerator(config['seeds']['graph'], graph_params)
+            return generator.graph
+
+def generate_passengers(config: Dict, run_index: int, graph: Graph) -> List[Passenger]:
+    """Passengers of one run of an experiment, seeded by the passenger seed and the run index"""
+    passenger_seed = config['seeds']['passengers'] + run_index
+
+    with span('passengers'):
+        pass_generator = PassengerGenerator(passenger_seed, graph, config['passenger_params'])
+        return pass_generator.passengers
+
+def optimise_passengers(config: Dict, graph: Graph, passengers: List[Passenger], run_index: int = None) -> Tuple[Solution, float]:
+    """Optimise the passengers of a run, returning the optimised Solution and the time
+    taken by the optimiser. The optimiser is profiled if the run is profiled.
+    """
+    with span('prune_graph'):
+        optimiser = Optimiser(config['seeds']['algorithm'], graph, passengers)
+
+    with span('optimise'), RunProfiler(config, run_index):
+        t_start = time.perf_counter()
+        solution = optimiser.optimise(config['optimiser_params'])
+        t_end = time.perf_counter()
+
+    if not solution.objectives:
+        with span('objectives'):
+            solution.calculate_objectives()
+
+    return solution, t_end - t_start
+
+def simulate_run(config: Dict, run_index: int, graph: Graph = None) -> Tuple[Solution, float, Optional[Dict]]:
+    """Generate the passengers of one run of an experiment, and optimise them. The graph
+    of the experiment is generated unless it is given.
+    Returns the optimised Solution, the time taken by the optimiser, and the trace of
+    the run if the experiment is traced.
+    """
+    run_tracer = new_tracer(config)
+
+    with tracing(run_tracer):
+        # Generate graph
+        if graph is None:
+            graph = generate_graph(config)
+
+        # Generate passengers
+        passengers = generate_passengers(config, run_index, graph)
+
+        # Optimise
+        solution, elapsed = optimise_passengers(config, graph, passengers, run_index)
+
+    return solution, elapsed, run_tracer.summary() if run_tracer else None
+
+def simulate_run_objectives(config: Dict, run_index: int, graph: Graph = None) -> Tuple[Dict[str, float], float, Optional[Dict]]:
+    """Objectives of one run of an experiment, along with the time taken by the optimiser
+    and the trace of the run
+    """
+    solution, elapsed, trace = simulate_run(config, run_index, graph)
+    return solution.objectives, elapsed, trace
+
+# Experiment and graph shared by the runs of the current worker process
+_config = None
+_graph = None
+
+def _initialise_worker(config: Dict, graph: Graph) -> None:
+    global _config, _graph
+    _config = config
+    _graph = graph
+    disable_nested_pool()
+
+def _simulate_worker_run(run_index: int) -> Tuple[Dict[str, float], float, Optional[Dict]]:
+    return simulate_run_objectives(_config, run_index, _graph)
 
 class Simulation:
     def __init__(self, config_file) -> None:
 
         with open(config_file, "r") as f:
-            self.config = yaml.safe_load(f)
+            self.config = prepare_config(yaml.safe_load(f))
             self.seed_params = self.config['seeds']
             self.graph_params = self.config['graph_params']
             self.passenger_params = self.config['passenger_params']
             self.optimiser_params = self.config['optimiser_params']
-            self.optimiser_params['algorithm_params']['service_hours'] = self.passenger_params['service_hours']
             self.experiment_params = self.config['experiment_params']
 
     def run(self):
-        
+
         runs = self.experiment_params['runs']
-        graph_seed = self.seed_params['graph']
-        passenger_seeds = [self.seed_params['passengers'] + x for x in range(runs)]
-        optimiser_seed = self.seed_params['algorithm']
-
-        solutions = []
-        elapsed = []
-        graphs = []
-        for x in range(runs):
-            # Generate graph
-            graph = None
-            try: 
-                self.graph_params['dataset']
-                generator = DatasetGraphGenerator(self.graph_params)
-                graph = generator.graph
-                graphs.append(graph)
-            except:
-                generator = SyntheticGraphGenerator(graph_seed, self.graph_params)
-                graph = generator.graph
-                graphs.append(graph)
-
-            # Generate passengers
-            pass_generator = PassengerGenerator(passenger_seeds[x], graph, self.passenger_params)
-            passengers = pass_generator.passengers
-
-            # Set up optimiser
-            optimiser = Optimiser(optimiser_seed, graph, passengers)
-            t_start = time.perf_counter()
-            solution = optimiser.optimise(self.optimiser_params)
-            t_end = time.perf_counter()
-            elapsed.append(t_end - t_start)
-            solutions.append(solution)
-
-        print(solutions[0])
-        write_simulation_output(self.config, solutions, elapsed)
+        workers = self.experiment_params.get('workers', 1)
+
+        # Runs completed before an interruption are read back from the checkpoint
+        checkpoint = Checkpoint(self.config)
+        completed = checkpoint.completed()
+        pending = [x for x in range(runs) if x not in completed]
+
+        # Every run uses the same graph, so it is only generated once
+        experiment_tracer = new_tracer(self.config)
+        with tracing(experiment_tracer):
+            graph = generate_graph(self.config) if pending else None
 
+        if workers > 1 and len(pending) > 1:
+            # The graph is handed to each worker once, and results come back in run order
+            with ProcessPoolExecutor(min(workers, len(pending)), initializer=_initialise_worker, initargs=(self.config, graph)) as pool:
+                for x, result in zip(pending, pool.map(_simulate_worker_run, pending)):
+                    checkpoint.record(x, *result)
+                    completed[x] = result
+        else:
+            for x in pending:
+                solution, elapsed_time, trace = simulate_run(self.config, x, graph)
+                if x == 0:
+                    print(solution)
+                checkpoint.record(x, solution.objectives, elapsed_time, trace)
+                completed[x] = (solution.objectives, elapsed_time, trace)
 
+        objectives = [completed[x][0] for x in range(runs)]
+        elapsed = [completed[x][1] for x in range(runs)]
+        traces = [completed[x][2] for x in range(runs)]
 
+        with tracing(experiment_tracer), span('output'):
+            output_dir = write_simulation_output(self.config, objectives, elapsed, peak_memory(self.config, traces))
 
+        if experiment_tracer:
+            write_trace_output(output_dir, experiment_tracer.summary(), traces)
+        write_profile_output(output_dir, self.config)
+        checkpoint.remove()
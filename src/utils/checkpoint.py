@@ -0,0 +1,94 @@
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import copy
+import hashlib
+import json
+import os
+
+CHECKPOINT_PATH = Path("./simulation_output/checkpoints")
+
+def config_hash(config: Dict) -> str:
+    """Hash of an experiment config, ignoring the parameters that do not change the result
+    of a run (the number of runs and of workers)
+    """
+    config = copy.deepcopy(config)
+    experiment_params = config.get('experiment_params', dict())
+    experiment_params.pop('runs', None)
+    experiment_params.pop('workers', None)
+
+    encoded = json.dumps(config, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+class Checkpoint:
+    """Append-only record of the completed runs of an experiment
+
+    Every completed run is appended to a JSON lines file as soon as it is done,
+    keyed by the hash of the experiment config and the run index, so that an
+    interrupted experiment only needs to compute its remaining runs.
+
+    Attributes
+    ----------
+    key: str
+        Hash of the experiment config
+    path: Path
+        Checkpoint file of the experiment
+
+    Methods
+    ----------
+    completed()
+        Objectives, elapsed time and trace of the runs recorded so far, by run index
+    record(run_index, objectives, elapsed, trace)
+        Append a completed run to the checkpoint
+    remove()
+        Delete the checkpoint, once the output of the experiment is written
+    """
+
+    def __init__(self, config: Dict, directory: Path = CHECKPOINT_PATH) -> None:
+        self.key = config_hash(config)
+        self.path = Path(directory, f"{self.key}.jsonl")
+
+    def completed(self) -> Dict[int, Tuple[Dict[str, float], float, Optional[Dict]]]:
+        runs = dict()
+        if not self.path.is_file():
+            return runs
+
+        with self.path.open("r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Last line of a process interrupted while writing it
+                    continue
+                if record['config'] == self.key:
+                    runs[record['run']] = (record['objectives'], record['elapsed'], record.get('trace'))
+
+        return runs
+
+    def record(self, run_index: int, objectives: Dict[str, float], elapsed: float, trace: Optional[Dict] = None) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        record = {
+            'config': self.key,
+            'run': run_index,
+            'objectives': {objective: float(value) for objective, value in objectives.items()},
+            'elapsed': elapsed
+        }
+        if trace is not None:
+            record['trace'] = trace
+
+        with self.path.open("a+b") as f:
+            # Terminate the line left incomplete by an interrupted process, if any
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+            f.write((json.dumps(record) + "\n").encode())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def remove(self) -> None:
+        self.path.unlink(missing_ok=True)
+        try:
+            self.path.parent.rmdir()
+        except OSError:
+            # Checkpoints of other experiments are still in progress
+            pass
@@ -2,6 +2,7 @@ import igraph as ig
 import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
+import numpy as np
 from models.graph import Graph
 
 def plot_graph(graph: Graph, path: str) -> None:
@@ -67,6 +68,30 @@ def plot_preference_distribution(dist, path):
     sns.histplot(data=df, x='hours', hue='journey_type', multiple='dodge', ax=ax)
     plt.savefig(path)
 
+def plot_scaling(results, x, y, fits, path):
+    """Log-log plot of a measure (y) of every algorithm against an instance size (x),
+    along with the power laws fitted to them
+    """
+    df = pd.DataFrame(results)
+    algorithms = list(df['algorithm'].unique())
+    palette = dict(zip(algorithms, sns.color_palette("deep", len(algorithms))))
+
+    sns.set_style("whitegrid")
+    fig, ax = plt.subplots()
+    sns.lineplot(data=df, x=x, y=y, hue='algorithm', palette=palette, marker='o', ax=ax)
+
+    for fit in fits:
+        sizes = df[df['algorithm'] == fit['algorithm']][x]
+        fitted_sizes = np.geomspace(sizes.min(), sizes.max(), 50)
+        ax.plot(fitted_sizes, fit['coefficient'] * fitted_sizes**fit['exponent'], linestyle='--',
+            color=palette[fit['algorithm']], label=f"{fit['algorithm']} ~ {x}^{fit['exponent']:.2f}")
+
+    ax.set_xscale('log')
+    ax.set_yscale('log')
+    ax.legend()
+    fig.savefig(path)
+    plt.close(fig)
+
 
 
 
@@ -43,26 +43,44 @@ def environment_info(env: 'Environment') -> str:
     "Graph:",
     graph_properties.get_string()])
 
-def solution_info(solution: "Solution") -> str:
+def tour_info(solution: "Solution") -> PrettyTable:
 
     schedule = PrettyTable()
     schedule.field_names = ['Visit Order', 'Location ID', 'Pick Ups', 'Drop Offs', 'Arrival', 'Wait Time', 'Departure Time']
 
-    rider_sched = PrettyTable()
-    rider_sched.field_names = ['Passenger', 'Travel Locations', 'Departure', 'Actual Departure', 'Arrival', 'Actual Arrival', 'Utility']
-
     for index, tour_node in enumerate(solution.llist.iternodes()):
         row_data = [index, tour_node.value.location_id, list(tour_node.value.pick_up), list(tour_node.value.drop_off), tour_node.value.arrival_time, tour_node.value.waiting_time, tour_node.value.departure_time]
         schedule.add_row(row_data)
 
+    return schedule
+
+def rider_schedule_info(solution: "Solution") -> PrettyTable:
+
+    rider_sched = PrettyTable()
+    rider_sched.field_names = ['Passenger', 'Travel Locations', 'Departure', 'Actual Departure', 'Arrival', 'Actual Arrival', 'Utility']
+
     for agent in solution.agents:
         departure_time = solution.rider_schedule['departure'][agent.rider.id]
         arrival_time = solution.rider_schedule['arrival'][agent.rider.id]
         utility = agent.rider.utility(departure_time, arrival_time)
         row_data = [f'P:{agent.rider.id}', f'{agent.rider.start_id} - {agent.rider.destination_id}', agent.rider.optimal_departure, departure_time, agent.rider.optimal_arrival, arrival_time, utility]
         rider_sched.add_row(row_data)
-    
+
+    return rider_sched
+
+def solution_info(solution: "Solution") -> str:
+    schedule = tour_info(solution)
+    rider_sched = rider_schedule_info(solution)
     return "\n".join(['Schedule', f'{schedule.get_string()}', 'Rider Utils', rider_sched.get_string()]) 
+
+def fleet_info(fleet: "Fleet") -> str:
+    info = []
+
+    for vehicle_id, tour in enumerate(fleet.tours):
+        info.extend([f'Schedule (Vehicle {vehicle_id})', tour_info(tour).get_string()])
+
+    info.extend(['Rider Utils', rider_schedule_info(fleet).get_string()])
+    return "\n".join(info)
     
 def strategy_info(strat_obj):
     info = []
@@ -84,6 +102,14 @@ def strategy_info(strat_obj):
         ]
         return "\n".join(info)
 
+    elif strat_obj.strat['action'] == 'append':
+        info = [
+            f'Action: Append',
+            f"allocated_node: {strat_obj.strat['allocated_node']}",
+            f"agent: {strat_obj.strat['agent']}"
+        ]
+        return "\n".join(info)
+
     elif strat_obj.strat['action'] == 'insert_after':
         info = [
             f'Action: Insert After',
@@ -1,7 +1,9 @@
 from pathlib import Path
+from utils.tracing import merge_traces
 import utils.graph_utils as graph_utils
 import numpy as np
 import csv
+import json
 import yaml
 import re
 
@@ -23,7 +25,7 @@ def write_illustration_output(graphs, beta_dists, preference_dists):
         graph_utils.plot_beta_distribution(beta_dist, path=str(beta_dist_file))
         graph_utils.plot_preference_distribution(preference_dist, path=str(pref_dist_file))
 
-def write_simulation_output(config, solutions, elapsed):
+def write_simulation_output(config, objectives, elapsed, peak_memory=None):
     
     output_path = Path("./simulation_output")
     if not output_path.is_dir():
@@ -93,6 +95,10 @@ def write_simulation_output(config, solutions, elapsed):
             'elapsed_time'
         ]
 
+    # Peak memory of every run, if the experiment tracks memory
+    if peak_memory is not None:
+        fieldnames.append('peak_memory_mb')
+
     # Flatten config dict
     passenger_params = config['passenger_params']
     graph_params = config['graph_params']
@@ -116,8 +122,7 @@ def write_simulation_output(config, solutions, elapsed):
     with full_csv_file.open('w') as f:
         writer = csv.DictWriter(f, fieldnames=fieldnames)
         writer.writeheader()
-        for solution, elapsed_time in zip(solutions, elapsed):
-            objective_dict = solution.objectives
+        for run, (objective_dict, elapsed_time) in enumerate(zip(objectives, elapsed)):
             utilitarian.append(objective_dict['utilitarian'])
             egalitarian.append(objective_dict['egalitarian'])
             proportional.append(objective_dict['proportionality'])
@@ -126,6 +131,8 @@ def write_simulation_output(config, solutions, elapsed):
 
             elapsed_times.append(elapsed_time)
             elapsed_dict = {"elapsed_time": elapsed_time}
+            if peak_memory is not None:
+                elapsed_dict['peak_memory_mb'] = peak_memory[run]
             row = {**passenger_params, **graph_params, **algo_params, **objective_dict, **elapsed_dict}
             writer.writerow(row)
     
@@ -185,6 +192,7 @@ def write_simulation_output(config, solutions, elapsed):
     with global_summary_csv_file.open("r") as f:
         global_reader = csv.DictReader(f)
         id_dict["id"] = len(list(global_reader))
+        existing_fieldnames = global_reader.fieldnames
     
     with local_summary_csv_file.open('w') as local_f, global_summary_csv_file.open("a") as global_f:
         objective_dict = {
@@ -195,15 +203,26 @@ def write_simulation_output(config, solutions, elapsed):
             'avg_gini_index': np.mean(ginis)
         }
 
+        # The global summary keeps the same columns for every experiment, so its peak
+        # memory is left empty if the experiment does not track memory. Summaries
+        # started before peak memory was tracked keep their columns
+        global_fieldnames = [field for field in summary_fieldnames]
+        global_fieldnames.insert(0, "id")
+        if existing_fieldnames is None or 'peak_memory_mb' in existing_fieldnames:
+            global_fieldnames.append('peak_memory_mb')
+        if peak_memory is not None:
+            summary_fieldnames.append('peak_memory_mb')
+
         local_writer = csv.DictWriter(local_f, fieldnames=summary_fieldnames)
         local_writer.writeheader()
         elapsed_dict = {"avg_elapsed_time": np.mean(elapsed_times)}
+        # Largest peak memory of the runs
+        if peak_memory is not None:
+            elapsed_dict['peak_memory_mb'] = max(peak_memory)
         local_row = {**passenger_params, **graph_params, **algo_params, **objective_dict, **elapsed_dict}
         local_writer.writerow(local_row)
 
 
-        global_fieldnames = [field for field in summary_fieldnames]
-        global_fieldnames.insert(0, "id")
         global_writer = csv.DictWriter(global_f, fieldnames=global_fieldnames)
         global_reader = csv.DictReader(global_f)
 
@@ -212,4 +231,23 @@ def write_simulation_output(config, solutions, elapsed):
         
         id_dict = {"id": id}
         global_row = {**local_row, **id_dict, **elapsed_dict}
+        if 'peak_memory_mb' not in global_fieldnames:
+            # Only written to the summary of the experiment
+            global_row.pop('peak_memory_mb', None)
         global_writer.writerow(global_row)
+
+    return new_dir
+
+def write_trace_output(output_dir, experiment_trace, run_traces):
+    """Trace of an experiment, made of the phases shared by its runs (graph, output), the
+    trace of every run, and their total
+    """
+    trace_file = Path(output_dir, "trace.json")
+    runs = [{'run': run, **trace} for run, trace in enumerate(run_traces) if trace is not None]
+
+    with trace_file.open('w') as f:
+        json.dump({
+            'experiment': experiment_trace,
+            'runs': runs,
+            'total': merge_traces(experiment_trace, *runs)
+        }, f, indent=2)
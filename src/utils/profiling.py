@@ -0,0 +1,249 @@
+"""Profiling of the optimiser phase of selected runs
+
+A profiled experiment sets `experiment_params.profile`, with a `mode`:
+
+- `deterministic` profiles every function call with cProfile
+- `sampling` records the call stack of the optimiser every `interval` seconds from
+  a background thread, which barely slows the optimiser down
+
+Runs write their profile to a staging directory keyed by the config hash of their
+experiment as soon as they are done, so that runs of any process or node sharing the
+staging directory are aggregated when the output of the experiment is written: a
+table of the hottest functions, and collapsed stacks that flame graph tools can read.
+"""
+
+from utils.checkpoint import config_hash
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+import cProfile
+import io
+import json
+import os
+import pstats
+import shutil
+import sys
+import threading
+
+PROFILE_PATH = Path("./simulation_output/profiles")
+
+# Staging directory of the profiles written and aggregated by the current process
+_profile_path = PROFILE_PATH
+
+def set_profile_path(path) -> None:
+    """Stage profiles in the given directory, e.g. one shared by every node"""
+    global _profile_path
+    _profile_path = Path(path)
+
+def set_profile(experiments: List[Dict], mode: Optional[str], runs: Optional[List[int]] = None) -> None:
+    """Profile the given runs, or every run, of every experiment, overriding the config"""
+    if mode is None:
+        return
+    for experiment in experiments:
+        experiment['experiment_params']['profile'] = {'mode': mode}
+        if runs is not None:
+            experiment['experiment_params']['profile']['runs'] = runs
+
+def profile_settings(config: Dict, run_index: Optional[int]) -> Optional[Dict]:
+    """Profile settings of the experiment, if the run is profiled"""
+    settings = config['experiment_params'].get('profile')
+    if not settings or run_index is None:
+        return None
+    if settings.get('runs') is not None and run_index not in settings['runs']:
+        return None
+    return settings
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class StackSampler:
+    """Background thread sampling the call stack of another thread
+
+    Attributes
+    ----------
+    interval: float
+        Seconds between samples
+    stacks: Counter
+        Number of samples of every collapsed stack, from the root frame to the
+        innermost frame, with frame labels separated by semicolons
+
+    Methods
+    ----------
+    start(root)
+        Start sampling the stack of the calling thread, below the root frame
+    stop()
+        Stop sampling
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.stacks = Counter()
+        self.__stop = threading.Event()
+        self.__thread = None
+        self.__thread_id = None
+        self.__root = None
+
+    def start(self, root) -> None:
+        self.__thread_id = threading.get_ident()
+        self.__root = root
+        self.__thread = threading.Thread(target=self.__sample, daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        self.__stop.set()
+        self.__thread.join()
+
+    def __sample(self) -> None:
+        while not self.__stop.wait(self.interval):
+            frame = sys._current_frames().get(self.__thread_id)
+            labels = []
+            while frame is not None and frame is not self.__root:
+                labels.append(frame_label(frame))
+                frame = frame.f_back
+            if labels:
+                self.stacks[";".join(reversed(labels))] += 1
+
+class RunProfiler:
+    """Context manager profiling the block it wraps, if the run is profiled, and writing
+    the profile to the staging directory of the experiment
+    """
+
+    def __init__(self, config: Dict, run_index: Optional[int]) -> None:
+        self.settings = profile_settings(config, run_index)
+        self.run_index = run_index
+        self.directory = Path(_profile_path, config_hash(config))
+        self.__profiler = None
+        self.__sampler = None
+
+    def __enter__(self) -> "RunProfiler":
+        if self.settings is None:
+            return self
+
+        if self.settings['mode'] == 'sampling':
+            self.__sampler = StackSampler(self.settings.get('interval', 0.005))
+            # Frame running the profiled block
+            self.__sampler.start(sys._getframe(1))
+        else:
+            self.__profiler = cProfile.Profile()
+            self.__profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.settings is None:
+            return
+
+        if self.__sampler is not None:
+            self.__sampler.stop()
+            self.directory.mkdir(parents=True, exist_ok=True)
+            record = {'interval': self.__sampler.interval, 'stacks': dict(self.__sampler.stacks)}
+            Path(self.directory, f"run_{self.run_index}.json").write_text(json.dumps(record))
+        else:
+            self.__profiler.disable()
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self.__profiler.dump_stats(str(Path(self.directory, f"run_{self.run_index}.prof")))
+
+def call_graph_stacks(stats: pstats.Stats, min_fraction: float = 1e-4) -> Dict[str, float]:
+    """Collapsed stacks, in seconds, estimated from the call graph of a deterministic profile.
+
+    cProfile only records the time of every caller -> callee pair, so the time of a
+    function within a deeper stack is estimated by splitting its time under a caller
+    between its own time and its callees, in the same proportions as over the whole
+    profile. Stacks below min_fraction of the total time are dropped.
+    """
+    raw = stats.stats
+    callees = dict()
+    for function, (_, _, _, _, callers) in raw.items():
+        for caller, (_, _, _, edge_cumulative) in callers.items():
+            callees.setdefault(caller, []).append((function, edge_cumulative))
+
+    roots = [function for function, entry in raw.items() if not any(caller in raw for caller in entry[4])]
+    total = sum(raw[root][3] for root in roots)
+    stacks = Counter()
+
+    def label(function) -> str:
+        filename, line, name = function
+        return f"{name} ({os.path.basename(filename)}:{line})"
+
+    def walk(function, path: List, labels: List[str], cumulative: float) -> None:
+        _, _, own, function_cumulative, _ = raw[function]
+        scale = cumulative / function_cumulative if function_cumulative > 0 else 0
+        stacks[";".join(labels)] += own * scale
+
+        for callee, edge_cumulative in callees.get(function, []):
+            callee_cumulative = edge_cumulative * scale
+            if callee in path or callee_cumulative < total * min_fraction:
+                continue
+            walk(callee, path + [callee], labels + [label(callee)], callee_cumulative)
+
+    for root in roots:
+        walk(root, [root], [label(root)], raw[root][3])
+
+    return stacks
+
+def write_profile_output(output_dir, config: Dict, num_functions: int = 50) -> None:
+    """Aggregate the staged profiles of the runs of an experiment into its output folder,
+    then delete them
+    """
+    settings = config['experiment_params'].get('profile')
+    directory = Path(_profile_path, config_hash(config))
+    if not settings or not directory.is_dir():
+        return
+
+    hot_functions_file = Path(output_dir, "profile_hot_functions.txt")
+    collapsed_stacks_file = Path(output_dir, "profile_collapsed_stacks.txt")
+
+    if settings['mode'] == 'sampling':
+        records = [json.loads(path.read_text()) for path in sorted(directory.glob("run_*.json"))]
+        stacks = Counter()
+        for record in records:
+            stacks.update(record['stacks'])
+        interval = records[0]['interval'] if records else 0
+
+        # Samples with the function innermost (self) or anywhere in the stack (total)
+        own_samples = Counter()
+        total_samples = Counter()
+        for stack, samples in stacks.items():
+            labels = stack.split(";")
+            own_samples[labels[-1]] += samples
+            for label in set(labels):
+                total_samples[label] += samples
+        num_samples = sum(stacks.values())
+
+        with hot_functions_file.open('w') as f:
+            f.write(f"{num_samples} samples every {interval}s over {len(records)} run(s)\n\n")
+            f.write(f"{'self %':>8} {'total %':>8} {'self s':>10}  function\n")
+            hot_functions = sorted(total_samples, key=lambda label: (-own_samples[label], -total_samples[label]))
+            for label in hot_functions[:num_functions]:
+                samples = own_samples[label]
+                f.write(f"{100*samples/num_samples:8.2f} {100*total_samples[label]/num_samples:8.2f} {samples*interval:10.3f}  {label}\n")
+
+        with collapsed_stacks_file.open('w') as f:
+            for stack, samples in sorted(stacks.items()):
+                f.write(f"{stack} {samples}\n")
+
+    else:
+        profile_files = [str(path) for path in sorted(directory.glob("run_*.prof"))]
+        if profile_files:
+            stats = pstats.Stats(*profile_files)
+            stats.dump_stats(str(Path(output_dir, "profile.prof")))
+
+            with hot_functions_file.open('w') as f:
+                f.write(f"Deterministic profile of {len(profile_files)} run(s)\n\n")
+                for sort_key in ['tottime', 'cumulative']:
+                    stream = io.StringIO()
+                    pstats.Stats(*profile_files, stream=stream).sort_stats(sort_key).print_stats(num_functions)
+                    f.write(stream.getvalue())
+
+            # Collapsed stacks are weighted in microseconds
+            with collapsed_stacks_file.open('w') as f:
+                for stack, seconds in sorted(call_graph_stacks(stats).items()):
+                    if round(seconds*1e6) > 0:
+                        f.write(f"{stack} {round(seconds*1e6)}\n")
+
+    shutil.rmtree(directory)
+    try:
+        _profile_path.rmdir()
+    except OSError:
+        # Profiles of other experiments are still staged
+        pass
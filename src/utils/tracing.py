@@ -0,0 +1,216 @@
+"""Lightweight tracing of the phases of a run
+
+Spans time nested phases, and counters count events within them (insert candidates
+evaluated, voting rounds, travel time lookups...). Both are recorded by the active
+Tracer. No tracer is active by default, in which case span() returns a shared
+context manager that does nothing, and count() returns straight away.
+
+A tracer may also track memory: allocations are then traced with tracemalloc while
+the tracer is active, every span records the peak of the traced memory within it,
+and the allocation sites holding the most memory at the end of every top level span
+are recorded. The peak resident set size of a process is not part of a trace, as it
+is a high-water mark covering everything the process ran before, including the
+earlier tasks of a worker process, and is not broken down by span.
+"""
+
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where the peak resident set size is not recorded
+    resource = None
+
+# Tracer recording the spans and counters of the current process, if any
+_tracer = None
+_disabled_span = nullcontext()
+
+# Number of allocation sites kept in a trace
+NUM_ALLOCATION_SITES = 20
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of the current process since it started, in MB. A
+    high-water mark covering everything the process ran so far, only meaningful
+    for a process running a single measurement
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+def peak_traced_memory_mb(trace: Dict, excluded: List[str] = ()) -> float:
+    """Peak traced memory of a trace that tracks memory, the largest peak of its spans
+    other than the excluded top level spans and the spans nested in them
+    """
+    return max(
+        totals['peak_memory_mb'] for path, totals in trace['spans'].items()
+        if path.split("/")[0] not in excluded
+    )
+
+def top_allocation_sites(sites: Dict[str, float]) -> Dict[str, float]:
+    return dict(sorted(sites.items(), key=lambda item: -item[1])[:NUM_ALLOCATION_SITES])
+
+class Tracer:
+    """Total time and number of calls of nested spans, along with counters
+
+    Attributes
+    ----------
+    spans: Dict[str, List]
+        Total time in seconds, number of calls and peak traced memory in bytes of every
+        span, by path. The path of a span joins the names of the spans it is nested in,
+        e.g. 'optimise/final_vote'
+    counters: Dict[str, int]
+        Total of every counter
+    memory: bool
+        Whether memory is tracked
+    allocation_sites: Dict[str, int]
+        Largest memory in bytes held by every allocation site (file:line) at the end
+        of a top level span
+
+    Methods
+    ----------
+    span(name)
+        Context manager timing a span nested in the spans currently open
+    count(name, value)
+        Add to a counter
+    summary()
+        JSON serialisable trace of the spans and counters
+    """
+
+    def __init__(self, memory: bool = False) -> None:
+        self.spans = dict()
+        self.counters = dict()
+        self.memory = memory
+        self.allocation_sites = dict()
+        self.__stack = []
+        # Peak traced memory of the spans currently open, before their current segment
+        self.__peaks = []
+
+    @contextmanager
+    def span(self, name: str):
+        self.__stack.append(name)
+        path = "/".join(self.__stack)
+        measure_memory = self.memory and tracemalloc.is_tracing()
+        if measure_memory:
+            self.__start_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = self.__end_peak() if measure_memory else 0
+            if measure_memory and len(self.__stack) == 1:
+                self.__record_allocation_sites()
+            self.__stack.pop()
+            totals = self.spans.setdefault(path, [0.0, 0, 0])
+            totals[0] += elapsed
+            totals[1] += 1
+            totals[2] = max(totals[2], peak)
+
+    def __start_peak(self) -> None:
+        # tracemalloc only keeps one peak, which is reset for the new span once the
+        # peak so far is handed on to the span it is nested in
+        _, peak = tracemalloc.get_traced_memory()
+        if self.__peaks:
+            self.__peaks[-1] = max(self.__peaks[-1], peak)
+        self.__peaks.append(0)
+        tracemalloc.reset_peak()
+
+    def __end_peak(self) -> int:
+        _, peak = tracemalloc.get_traced_memory()
+        peak = max(self.__peaks.pop(), peak)
+        if self.__peaks:
+            self.__peaks[-1] = max(self.__peaks[-1], peak)
+        return peak
+
+    def __record_allocation_sites(self) -> None:
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>")
+        ])
+        for statistic in snapshot.statistics('lineno'):
+            frame = statistic.traceback[0]
+            site = f"{os.path.basename(frame.filename)}:{frame.lineno}"
+            self.allocation_sites[site] = max(self.allocation_sites.get(site, 0), statistic.size)
+
+    def count(self, name: str, value: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self) -> Dict:
+        spans = dict()
+        for path, (total, calls, peak) in self.spans.items():
+            spans[path] = {'time': total, 'calls': calls}
+            if self.memory:
+                spans[path]['peak_memory_mb'] = peak / 2**20
+
+        summary = {'spans': spans, 'counters': dict(self.counters)}
+        if self.memory:
+            summary['memory'] = {
+                'allocation_sites': top_allocation_sites({site: size / 2**20 for site, size in self.allocation_sites.items()})
+            }
+        return summary
+
+@contextmanager
+def tracing(tracer: Optional[Tracer]):
+    """Record the spans and counters of a block with a tracer. A tracer of None
+    disables tracing within the block. Allocations are traced within the block if the
+    tracer tracks memory and they are not traced already.
+    """
+    global _tracer
+    previous = _tracer
+    _tracer = tracer
+    trace_allocations = tracer is not None and tracer.memory and not tracemalloc.is_tracing()
+    if trace_allocations:
+        tracemalloc.start()
+    try:
+        yield tracer
+    finally:
+        _tracer = previous
+        if trace_allocations:
+            tracemalloc.stop()
+
+def is_tracing() -> bool:
+    return _tracer is not None
+
+def span(name: str):
+    if _tracer is None:
+        return _disabled_span
+    return _tracer.span(name)
+
+def count(name: str, value: int = 1) -> None:
+    if _tracer is not None:
+        _tracer.count(name, value)
+
+def merge_traces(*traces: Dict) -> Dict:
+    """Trace adding up the time, calls and counters of several traces. Memory peaks
+    are not added up, but the largest is kept
+    """
+    merged = {'spans': dict(), 'counters': dict()}
+
+    for trace in traces:
+        for path, totals in trace['spans'].items():
+            merged_totals = merged['spans'].setdefault(path, {'time': 0.0, 'calls': 0})
+            merged_totals['time'] += totals['time']
+            merged_totals['calls'] += totals['calls']
+            if 'peak_memory_mb' in totals:
+                merged_totals['peak_memory_mb'] = max(merged_totals.get('peak_memory_mb', 0), totals['peak_memory_mb'])
+        for name, value in trace['counters'].items():
+            merged['counters'][name] = merged['counters'].get(name, 0) + value
+
+        if 'memory' in trace:
+            memory = merged.setdefault('memory', {'allocation_sites': dict()})
+            for site, size in trace['memory']['allocation_sites'].items():
+                memory['allocation_sites'][site] = max(memory['allocation_sites'].get(site, 0), size)
+
+    if 'memory' in merged:
+        merged['memory']['allocation_sites'] = top_allocation_sites(merged['memory']['allocation_sites'])
+
+    return merged
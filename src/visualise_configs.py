@@ -1,5 +1,6 @@
 import yaml
 from config_validator import validate_yaml
+from experiment_planner import expand_sweep
 from models.graph import SyntheticGraphGenerator
 from models.passenger import PassengerGenerator
 import utils.output_writer as writer
@@ -14,7 +15,7 @@ with open("config.yaml", "r") as file:
         preference_dists = []
 
         seed_config = config['seeds']
-        experiment_configs = config['experiments']
+        experiment_configs = [variant for experiment in config['experiments'] for variant in expand_sweep(experiment)]
 
         for exp_config in experiment_configs:
             graph_generator = SyntheticGraphGenerator(seed_config['graph'], exp_config['graph_params'])
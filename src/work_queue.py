@@ -0,0 +1,312 @@
+"""File-based work queue, to run the experiments of a config file on several nodes
+sharing a filesystem
+
+The coordinator plans the experiments and writes one task file per PassengerTask
+to the `pending` directory of the queue. Workers, on any node, claim a task by
+renaming its file to the `claimed` directory, which only one of them can do, run
+it and write its results to the `results` directory. A worker refreshes the
+modification time of its claim while it runs the task, and claims that are not
+refreshed within the lease are moved back to `pending`, to be retried by another
+worker. The coordinator records results in the checkpoints of the experiments as
+they arrive, and writes the output of the experiments in order.
+"""
+
+from algorithms.candidate_pool import disable_nested_pool
+from experiment_planner import ExperimentPlan, PassengerTask, artefact_key
+from run_experiments import load_experiments, run_passenger_task, write_experiment_output
+from simulation import generate_graph, shared_tracer
+from utils.tracing import tracing
+from utils.checkpoint import Checkpoint
+from utils.profiling import set_profile, set_profile_path
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import traceback
+
+def task_id(task: PassengerTask) -> str:
+    """Identifier of a task, from the passengers and the solutions it computes"""
+    return artefact_key(task.key, task.solution_keys)
+
+def task_record(task: PassengerTask) -> Dict:
+    return {
+        'key': task.key,
+        'graph_key': task.graph_key,
+        'config': task.config,
+        'run_index': task.run_index,
+        'optimisations': task.optimisations,
+        'solution_keys': task.solution_keys
+    }
+
+def load_task(record: Dict) -> PassengerTask:
+    task = PassengerTask(record['key'], record['graph_key'], record['config'], record['run_index'])
+    task.optimisations = record['optimisations']
+    task.solution_keys = record['solution_keys']
+    return task
+
+class WorkQueue:
+    """Task, claim and result files of a work queue directory
+
+    Attributes
+    ----------
+    path: Path
+        Directory of the queue, on a filesystem shared by every node
+
+    Methods
+    ----------
+    open()
+        Accept workers until the queue is closed
+    close()
+        Let workers exit once no task is pending
+    submit(task)
+        Add a task to the queue, unless it is already queued or done
+    claim()
+        Claim a pending task, returning its id and the task, or None
+    heartbeat(id)
+        Refresh the lease of a claimed task. False if the claim was lost
+    complete(id, results)
+        Write the results of a claimed task
+    fail(id, error)
+        Write the error raised by a claimed task
+    result(id)
+        Results of a task, or None if it is not done
+    failure(id)
+        Error raised by a task, or None if it did not fail
+    requeue_stale(lease)
+        Move claims not refreshed for lease seconds back to the pending tasks
+    """
+
+    def __init__(self, path) -> None:
+        self.path = Path(path)
+        self.__pending = self.path / "pending"
+        self.__claimed = self.path / "claimed"
+        self.__results = self.path / "results"
+        self.__failed = self.path / "failed"
+        self.__closed = self.path / "closed"
+
+        for directory in [self.__pending, self.__claimed, self.__results, self.__failed]:
+            directory.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def closed(self) -> bool:
+        return self.__closed.exists()
+
+    def open(self) -> None:
+        self.__closed.unlink(missing_ok=True)
+
+    def close(self) -> None:
+        self.__closed.touch()
+
+    def __write(self, path: Path, record: Dict) -> None:
+        # Written to a temporary file first, so that a file is never read half written
+        temporary = path.with_name(f".{path.stem}.{socket.gethostname()}.{os.getpid()}.tmp")
+        temporary.write_text(json.dumps(record))
+        os.replace(temporary, path)
+
+    def submit(self, task: PassengerTask) -> str:
+        id = task_id(task)
+        name = f"{id}.json"
+
+        # A failed task is retried when it is submitted again
+        Path(self.__failed, name).unlink(missing_ok=True)
+
+        if not any(Path(directory, name).exists() for directory in [self.__pending, self.__claimed, self.__results]):
+            self.__write(Path(self.__pending, name), task_record(task))
+
+        return id
+
+    def claim(self) -> Optional[Tuple[str, PassengerTask]]:
+        for path in sorted(self.__pending.glob("*.json")):
+            claimed = Path(self.__claimed, path.name)
+            try:
+                os.rename(path, claimed)
+                # The lease starts when the task is claimed, rather than when it was submitted
+                os.utime(claimed)
+                record = json.loads(claimed.read_text())
+            except FileNotFoundError:
+                # Claimed by another worker, or requeued before the lease was refreshed
+                continue
+
+            if Path(self.__results, path.name).exists():
+                # Requeued after a slow worker had completed it
+                claimed.unlink(missing_ok=True)
+                continue
+
+            return path.stem, load_task(record)
+
+        return None
+
+    def heartbeat(self, id: str) -> bool:
+        try:
+            os.utime(Path(self.__claimed, f"{id}.json"))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def complete(self, id: str, results: List[Tuple[Dict[str, float], float, Optional[Dict]]]) -> None:
+        results = [
+            [{objective: float(value) for objective, value in objectives.items()}, elapsed, trace]
+            for objectives, elapsed, trace in results
+        ]
+        self.__write(Path(self.__results, f"{id}.json"), {'results': results})
+        Path(self.__claimed, f"{id}.json").unlink(missing_ok=True)
+
+    def fail(self, id: str, error: str) -> None:
+        self.__write(Path(self.__failed, f"{id}.json"), {'error': error})
+        Path(self.__claimed, f"{id}.json").unlink(missing_ok=True)
+
+    def result(self, id: str) -> Optional[List[Tuple[Dict[str, float], float, Optional[Dict]]]]:
+        path = Path(self.__results, f"{id}.json")
+        if not path.exists():
+            return None
+        return [tuple(result) for result in json.loads(path.read_text())['results']]
+
+    def failure(self, id: str) -> Optional[str]:
+        path = Path(self.__failed, f"{id}.json")
+        if not path.exists():
+            return None
+        return json.loads(path.read_text())['error']
+
+    def requeue_stale(self, lease: float) -> None:
+        now = time.time()
+        for path in self.__claimed.glob("*.json"):
+            try:
+                if now - path.stat().st_mtime > lease:
+                    os.rename(path, Path(self.__pending, path.name))
+            except FileNotFoundError:
+                # Completed, or requeued by another process
+                pass
+
+def _keep_alive(queue: WorkQueue, id: str, interval: float, stop: threading.Event) -> None:
+    while not stop.wait(interval):
+        if not queue.heartbeat(id):
+            return
+
+def work(queue_path, lease: float = 300, poll: float = 5) -> None:
+    """Claim and run the tasks of a queue until it is closed and no task is pending"""
+    queue = WorkQueue(queue_path)
+    # Profiles are staged in the queue, where the coordinator aggregates them
+    set_profile_path(Path(queue_path, "profiles"))
+    graph_key = None
+    graph = None
+
+    while True:
+        claim = queue.claim()
+        if claim is None:
+            if queue.closed:
+                return
+            queue.requeue_stale(lease)
+            time.sleep(poll)
+            continue
+
+        id, task = claim
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=_keep_alive, args=(queue, id, lease / 3, stop), daemon=True)
+        heartbeat.start()
+
+        try:
+            # Tasks are planned graph by graph, so only the last graph is kept. The graph
+            # is part of the trace of the task that generated it
+            graph_trace = None
+            if task.graph_key != graph_key:
+                graph_tracer = shared_tracer(task.optimisations)
+                with tracing(graph_tracer):
+                    graph = generate_graph(task.config)
+                graph_key = task.graph_key
+                graph_trace = graph_tracer.summary() if graph_tracer else None
+            results = run_passenger_task(task, graph, graph_trace)
+        except Exception:
+            queue.fail(id, traceback.format_exc())
+        else:
+            queue.complete(id, results)
+        finally:
+            stop.set()
+            heartbeat.join()
+
+def _work_process(queue_path, lease: float, poll: float) -> None:
+    # The processes of a node share its CPUs, so they do not start pools of their own
+    disable_nested_pool()
+    work(queue_path, lease, poll)
+
+def coordinate(config_file, queue_path, lease: float = 300, poll: float = 5, profile: str = None, profile_runs: List[int] = None) -> None:
+    """Submit the pending runs of the experiments of a config file to a queue, and write
+    the output of every experiment once its runs are done. Results already in the
+    queue, or in the checkpoints, are not computed again.
+    """
+    experiments = load_experiments(config_file)
+    set_profile(experiments, profile, profile_runs)
+    set_profile_path(Path(queue_path, "profiles"))
+    queue = WorkQueue(queue_path)
+    queue.open()
+
+    checkpoints = [Checkpoint(experiment) for experiment in experiments]
+    completed = [checkpoint.completed() for checkpoint in checkpoints]
+    plan = ExperimentPlan(experiments, completed)
+    pending = {queue.submit(task): task for task in plan.tasks}
+
+    next_experiment = 0
+    while next_experiment < len(experiments):
+        for id, task in list(pending.items()):
+            results = queue.result(id)
+            if results is None:
+                error = queue.failure(id)
+                if error is not None:
+                    queue.close()
+                    raise RuntimeError(f"Task {id} failed:\n{error}")
+                continue
+
+            for result, outputs in zip(results, task.outputs):
+                for experiment_index, run_index in outputs:
+                    checkpoints[experiment_index].record(run_index, *result)
+                    completed[experiment_index][run_index] = result
+            del pending[id]
+
+        # Outputs are written in the order of the experiments
+        while next_experiment < len(experiments) and \
+            all(run in completed[next_experiment] for run in range(experiments[next_experiment]['experiment_params']['runs'])):
+            write_experiment_output(experiments[next_experiment], completed[next_experiment])
+            checkpoints[next_experiment].remove()
+            print(f"Experiment {next_experiment+1} Done")
+            next_experiment += 1
+
+        if next_experiment < len(experiments):
+            queue.requeue_stale(lease)
+            time.sleep(poll)
+
+    queue.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the experiments of a config file through a shared work queue")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    coordinator_parser = subparsers.add_parser("coordinate", help="Submit the experiments and write their output")
+    coordinator_parser.add_argument("config_file", nargs="?", default="config.yaml")
+    coordinator_parser.add_argument("--profile", choices=["deterministic", "sampling"], default=None, help="Profile the optimiser of every experiment")
+    coordinator_parser.add_argument("--profile-runs", type=int, nargs="+", default=None, help="Runs to profile (defaults to every run)")
+
+    worker_parser = subparsers.add_parser("work", help="Run the tasks of the queue")
+    worker_parser.add_argument("--processes", type=int, default=1, help="Number of worker processes on this node")
+
+    for subparser in [coordinator_parser, worker_parser]:
+        subparser.add_argument("--queue", required=True, help="Queue directory, shared by every node")
+        subparser.add_argument("--lease", type=float, default=300, help="Seconds after which a claim that is not refreshed is retried")
+        subparser.add_argument("--poll", type=float, default=5, help="Seconds between checks of the queue")
+
+    args = parser.parse_args()
+
+    if args.command == "coordinate":
+        coordinate(args.config_file, args.queue, args.lease, args.poll, args.profile, args.profile_runs)
+    else:
+        workers = [
+            multiprocessing.Process(target=_work_process if args.processes > 1 else work, args=(args.queue, args.lease, args.poll))
+            for _ in range(args.processes)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()